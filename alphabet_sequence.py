@@ -2,6 +2,7 @@ import time
 import machine
 from cosmic import CosmicUnicorn
 from picographics import PicoGraphics, DISPLAY_COSMIC_UNICORN as DISPLAY
+from pens import cache_for
 
 # Define color groups for each letter
 COLOR_GROUPS = [
@@ -17,14 +18,15 @@ COLOR_GROUPS = [
 # Timing – the elevator script used short waits to keep the animation snappy.
 LETTER_DELAY = 0.75          # 750 ms between letter changes
 SEQUENCE_DELAY = 1.25        # 1250 ms between colour blocks
+FPS = 20                     # frame rate main.py runs draw() at
 
-# Create the CosmicUnicorn object and a graphics surface.
-cu = CosmicUnicorn()
-graphics = PicoGraphics(DISPLAY)
-graphics.set_font("sans")
+# The CosmicUnicorn object and graphics surface, set by main.py (or main() below).
+cu = None
+graphics = None
 
-# Use the same brightness level that works fine in the elevator demo.
-cu.set_brightness(0.8)
+# Pens, resolved in init() for whichever graphics surface we are drawing to.
+pens = None
+BLACK = None
 
 # Surface dimensions – the display is 32×32.
 width = CosmicUnicorn.WIDTH
@@ -40,11 +42,11 @@ frame_delay = LETTER_DELAY
 # Helper to draw a single centred letter.
 def draw_letter(letter: str, colour: tuple[int, int, int]):
     # Background is just a full‑screen clear with the background pen.
-    graphics.set_pen(graphics.create_pen(0, 0, 0))
+    graphics.set_pen(BLACK)
     graphics.clear()
 
     # Choose a different pen for the letter itself.
-    letter_pen = graphics.create_pen(*colour)
+    letter_pen = pens.get(*colour)
     graphics.set_pen(letter_pen)
 
     # How wide is the letter at the chosen scale?
@@ -55,17 +57,22 @@ def draw_letter(letter: str, colour: tuple[int, int, int]):
     y = 16
 
     graphics.text(letter, x, y, scale=FONT_SCALE)
-    cu.update(graphics)
 
-# Main animation loop.
-while True:
-    # Check if any buttons are pressed to exit
-    if (cu.is_pressed(CosmicUnicorn.SWITCH_A) or 
-        cu.is_pressed(CosmicUnicorn.SWITCH_B) or 
-        cu.is_pressed(CosmicUnicorn.SWITCH_C) or 
-        cu.is_pressed(CosmicUnicorn.SWITCH_D)):
-        machine.reset()
-    
+
+def init():
+    global pens, BLACK, current_group, current_letter, last_update, frame_delay
+    graphics.set_font("sans")
+    pens = cache_for(graphics)
+    BLACK = pens.get(0, 0, 0, pinned=True)
+
+    current_group = 0
+    current_letter = 0
+    last_update = 0
+    frame_delay = LETTER_DELAY
+
+
+def draw():
+    global current_group, current_letter, last_update, frame_delay
     current_time = time.ticks_ms()
     
     # Check if it's time to update the display
@@ -96,7 +103,33 @@ while True:
             frame_delay = LETTER_DELAY
         
         last_update = current_time
-    
-    # Small delay to prevent overwhelming the system
-    time.sleep(0.01)
-        
\ No newline at end of file
+
+
+# Main animation loop.
+def main():
+    global cu, graphics
+    # Create the CosmicUnicorn object and a graphics surface.
+    cu = CosmicUnicorn()
+    graphics = PicoGraphics(DISPLAY)
+
+    # Use the same brightness level that works fine in the elevator demo.
+    cu.set_brightness(0.8)
+
+    init()
+    while True:
+        # Check if any buttons are pressed to exit
+        if (cu.is_pressed(CosmicUnicorn.SWITCH_A) or 
+            cu.is_pressed(CosmicUnicorn.SWITCH_B) or 
+            cu.is_pressed(CosmicUnicorn.SWITCH_C) or 
+            cu.is_pressed(CosmicUnicorn.SWITCH_D)):
+            machine.reset()
+
+        draw()
+        cu.update(graphics)
+
+        # Small delay to prevent overwhelming the system
+        time.sleep(0.01)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,14 @@
 #
 # SPDX-License-Identifier: MIT
 
+import gc
 import os
+import time
+import asyncio
 import math
 import struct
+import micropython
+from array import array
 from machine import I2S, Pin
 
 """
@@ -14,6 +19,216 @@ https://github.com/miketeachman/micropython-i2s-examples/blob/master/examples/wa
 """
 
 
+# Scales count signed 16-bit samples in place by gain / 65536, where 0 <= gain < 65536.
+# Interleaved stereo is scaled the same way, as every sample gets the same gain.
+@micropython.viper  # noqa: F821
+def _scale_16bit(buffer, count: int, gain: int):
+    b = ptr16(buffer)  # noqa: F821
+    for i in range(count):
+        sample = int(b[i])
+        if sample & 0x8000:
+            sample -= 0x10000
+        b[i] = ((sample * gain) >> 16) & 0xFFFF
+
+
+# Scales count unsigned 8-bit samples in place around their midpoint of 128
+@micropython.viper  # noqa: F821
+def _scale_8bit(buffer, count: int, gain: int):
+    b = ptr8(buffer)  # noqa: F821
+    for i in range(count):
+        b[i] = (((int(b[i]) - 128) * gain) >> 16) + 128
+
+
+# Mixes count frames of signed 16-bit src, from frame start, into out from sample offset on, scaled
+# by gain / 65536 (0 <= gain < 65536) and saturated. Stereo sources are mixed down to mono
+@micropython.viper  # noqa: F821
+def _mix_16bit(out, offset: int, src, start: int, count: int, gain: int, channels: int):
+    o = ptr16(out)  # noqa: F821
+    s = ptr16(src)  # noqa: F821
+    j = start * channels
+    for i in range(offset, offset + count):
+        sample = int(s[j])
+        if sample & 0x8000:
+            sample -= 0x10000
+        if channels == 2:
+            right = int(s[j + 1])
+            if right & 0x8000:
+                right -= 0x10000
+            sample = (sample + right) >> 1
+        j += channels
+
+        mixed = int(o[i])
+        if mixed & 0x8000:
+            mixed -= 0x10000
+        mixed += (sample * gain) >> 16
+        if mixed > 32767:
+            mixed = 32767
+        elif mixed < -32768:
+            mixed = -32768
+        o[i] = mixed & 0xFFFF
+
+
+# Renders count samples of a 256 entry signed 16-bit wavetable into out, stepping through it
+# with a 8.16 fixed point phase accumulator and scaling by gain / 65536. Returns the next phase
+@micropython.viper  # noqa: F821
+def _render_tone(out, count: int, table, phase: int, step: int, gain: int) -> int:
+    o = ptr16(out)  # noqa: F821
+    t = ptr16(table)  # noqa: F821
+    for i in range(count):
+        sample = int(t[(phase >> 16) & 0xFF])
+        if sample & 0x8000:
+            sample -= 0x10000
+        o[i] = ((sample * gain) >> 16) & 0xFFFF
+        phase = (phase + step) & 0xFFFFFF
+    return phase
+
+
+# IMA-ADPCM quantizer step sizes, indexed 0 to 88
+IMA_STEPS = array("H", (
+    7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41, 45,
+    50, 55, 60, 66, 73, 80, 88, 97, 107, 118, 130, 143, 157, 173, 190, 209, 230, 253, 279, 307,
+    337, 371, 408, 449, 494, 544, 598, 658, 724, 796, 876, 963, 1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066,
+    2272, 2499, 2749, 3024, 3327, 3660, 4026, 4428, 4871, 5358, 5894, 6484, 7132, 7845, 8630, 9493, 10442, 11487, 12635, 13899,
+    15289, 16818, 18500, 20350, 22385, 24623, 27086, 29794, 32767))
+
+
+# Decodes the IMA-ADPCM blocks in the first length bytes of src into signed 16-bit samples in out,
+# interleaved when there are two channels, and returns the number of samples written. Each block
+# starts with a 4 byte header per channel (first sample, step index), followed by groups of 4 bytes
+# (8 samples, low nibble first) per channel in turn. The last block may be short
+@micropython.viper  # noqa: F821
+def _decode_ima(src, length: int, block_align: int, out, channels: int, steps) -> int:
+    s = ptr8(src)  # noqa: F821
+    o = ptr16(out)  # noqa: F821
+    t = ptr16(steps)  # noqa: F821
+    written = 0
+    block = 0
+    while block + 4 * channels <= length:
+        end = block + block_align
+        if end > length:
+            end = length
+        # Whole groups of 4 bytes per channel after the headers, the same number for every channel
+        # so a partial last block can't have one channel write frames past the others
+        groups = (end - block - 4 * channels) // (4 * channels)
+        for ch in range(channels):
+            h = block + 4 * ch
+            predictor = int(s[h]) | (int(s[h + 1]) << 8)
+            if predictor & 0x8000:
+                predictor -= 0x10000
+            index = int(s[h + 2])
+            if index > 88:
+                index = 88
+            o[written + ch] = predictor & 0xFFFF
+
+            frame = 1
+            data = block + 4 * channels + 4 * ch
+            for _ in range(groups):
+                for j in range(8):
+                    code = (int(s[data + (j >> 1)]) >> ((j & 1) << 2)) & 0xF
+                    step = int(t[index])
+                    diff = step >> 3
+                    if code & 1:
+                        diff += step >> 2
+                    if code & 2:
+                        diff += step >> 1
+                    if code & 4:
+                        diff += step
+                        index += ((code & 3) + 1) << 1
+                    else:
+                        index -= 1
+                    if code & 8:
+                        predictor -= diff
+                    else:
+                        predictor += diff
+
+                    if predictor > 32767:
+                        predictor = 32767
+                    elif predictor < -32768:
+                        predictor = -32768
+                    if index < 0:
+                        index = 0
+                    elif index > 88:
+                        index = 88
+                    o[written + frame * channels + ch] = predictor & 0xFFFF
+                    frame += 1
+                data += 4 * channels
+        written += (groups * 8 + 1) * channels
+        block += block_align
+    return written
+
+
+WAVETABLE_LENGTH = 256
+_wavetables = {}
+
+
+# Returns the single-cycle wavetable for a waveform, generating it on first use
+def _wavetable(waveform):
+    table = _wavetables.get(waveform)
+    if table is None:
+        n = WAVETABLE_LENGTH
+        if waveform == WavPlayer.WAVE_SINE:
+            values = [int(32767 * math.sin(2 * math.pi * i / n)) for i in range(n)]
+        elif waveform == WavPlayer.WAVE_SQUARE:
+            values = [32767 if i < n // 2 else -32767 for i in range(n)]
+        elif waveform == WavPlayer.WAVE_TRIANGLE:
+            values = [int(32767 * (1 - 4 * abs((i / n + 0.25) % 1 - 0.5))) for i in range(n)]
+        elif waveform == WavPlayer.WAVE_SAW:
+            values = [int(32767 * (2 * i / n - 1)) for i in range(n)]
+        else:
+            raise ValueError("unknown waveform")
+        table = array("h", values)
+        _wavetables[waveform] = table
+    return table
+
+
+# Converts frames of 8 or 16-bit mono or stereo samples in src to 16-bit samples with out_channels
+# channels in out, stepping through src by step / 65536 frames per output frame. Each output frame
+# takes the source frame at or before its position, there is no interpolation.
+# state[0] holds the 16.16 phase carried from one call to the next. Returns the frames written
+@micropython.viper  # noqa: F821
+def _convert(src, frames: int, channels: int, bits: int, out, out_channels: int, step: int, state) -> int:
+    s8 = ptr8(src)  # noqa: F821
+    s16 = ptr16(src)  # noqa: F821
+    o = ptr16(out)  # noqa: F821
+    st = ptr32(state)  # noqa: F821
+    phase = int(st[0])
+    limit = frames << 16
+    n = 0
+    while phase < limit:
+        i = (phase >> 16) * channels
+        if bits == 16:
+            left = int(s16[i])
+            if left & 0x8000:
+                left -= 0x10000
+            right = left
+            if channels == 2:
+                right = int(s16[i + 1])
+                if right & 0x8000:
+                    right -= 0x10000
+        else:
+            left = (int(s8[i]) - 128) << 8
+            right = left
+            if channels == 2:
+                right = (int(s8[i + 1]) - 128) << 8
+
+        if out_channels == 2:
+            o[n << 1] = left & 0xFFFF
+            o[(n << 1) + 1] = right & 0xFFFF
+        else:
+            o[n] = ((left + right) >> 1) & 0xFFFF
+        n += 1
+        phase += step
+    st[0] = phase - limit
+    return n
+
+
+@micropython.viper  # noqa: F821
+def _clear_16bit(buffer, count: int):
+    b = ptr16(buffer)  # noqa: F821
+    for i in range(count):
+        b[i] = 0
+
+
 class WavPlayer:
     # Internal states
     PLAY = 0
@@ -22,24 +237,56 @@ class WavPlayer:
     STOP = 3
     NONE = 4
 
+    # WAV format tag of IMA-ADPCM (4 bits per sample) files, which play as 16-bit
+    WAVE_FORMAT_IMA_ADPCM = 0x11
+
     MODE_WAV = 0
     MODE_TONE = 1
+    MODE_MIX = 2
 
     # Default buffer length
     SILENCE_BUFFER_LENGTH = 1000
     WAV_BUFFER_LENGTH = 10000
     INTERNAL_BUFFER_LENGTH = 20000
 
+    # Length of the buffer the mixer sums its voices into per callback
+    MIX_BUFFER_LENGTH = 2000
+    MIX_VOICES = 4
+
+    # Default RAM budget for clips preloaded with preload()
+    CLIP_CACHE_LENGTH = 64_000
+
     TONE_SAMPLE_RATE = 44_100
     TONE_BITS_PER_SAMPLE = 16
     TONE_FULL_WAVES = 2
+    # Length of the buffer play_tone() renders into per callback
+    TONE_BUFFER_LENGTH = 2000
+    # How many rendered tones the mixer keeps for play_voice_tone()
+    TONE_CACHE_SIZE = 8
+
+    # Tone waveforms
+    WAVE_SINE = 0
+    WAVE_SQUARE = 1
+    WAVE_TRIANGLE = 2
+    WAVE_SAW = 3
+
+    # How often the coroutines check whether a flush has finished
+    STOP_POLL_MS = 5
+    # Longest the blocking methods wait for playback to flush before releasing I2S anyway
+    STOP_TIMEOUT_MS = 1000
 
-    def __init__(self, id, sck_pin, ws_pin, sd_pin, amp_enable=None, ibuf_len=INTERNAL_BUFFER_LENGTH, root="/"):
+    # Software volume is a 16.16 fixed point gain, not applied at or above FULL_GAIN
+    GAIN_ONE = 1 << 16
+    FULL_GAIN = int(0.99 * GAIN_ONE)
+
+    def __init__(self, id, sck_pin, ws_pin, sd_pin, amp_enable=None, ibuf_len=INTERNAL_BUFFER_LENGTH, root="/",
+                 clip_cache_len=CLIP_CACHE_LENGTH, wav_buf_len=WAV_BUFFER_LENGTH):
         self.__id = id
         self.__sck_pin = sck_pin
         self.__ws_pin = ws_pin
         self.__sd_pin = sd_pin
         self.__ibuf_len = ibuf_len
+        self.__wav_buf_len = wav_buf_len
         self.__enable = None
 
         if amp_enable is not None:
@@ -53,6 +300,11 @@ class WavPlayer:
         self.__wav_file = None
         self.__loop_wav = False
         self.__first_sample_offset = None
+        self.__bits_per_sample = 16
+        self.__channels = 1
+        self.__block_align = 0          # Of the IMA-ADPCM file being played, 0 for PCM
+        self.__adpcm_mv = None          # Whole blocks read from it, decoded into __wav_samples_mv
+        self.__clip = None              # Samples of the preloaded clip being played, instead of __wav_file
         self.__flush_count = 0
         self.__audio_out = None
 
@@ -60,27 +312,113 @@ class WavPlayer:
         self.__silence_samples = bytearray(self.SILENCE_BUFFER_LENGTH)
 
         # Allocate a larger array for WAV audio samples, using a memoryview for more efficient access
-        self.__wav_samples_mv = memoryview(bytearray(self.WAV_BUFFER_LENGTH))
+        self.__wav_samples_mv = memoryview(bytearray(wav_buf_len))
+
+        # A file is read a section ahead into one of two buffers: the callback writes out the one
+        # read ahead, which I2S goes on reading from until the next callback, and schedules the
+        # next read into the other, whose write has completed, to run outside the callback
+        self.__spare_samples_mv = None  # The second buffer, allocated when a file is first played
+        self.__next_mv = None           # The buffer the next section is read into
+        self.__sent_mv = None           # The WAV buffer the last callback wrote, I2S reads it until the next one
+        self.__prefetched = 0           # Bytes of samples waiting in it, -1 while the read is pending
+        self.__prefetch_ref = self.__prefetch   # Bound once, so scheduling it doesn't allocate
+        self.__chunk_len = wav_buf_len  # Bytes of samples the callback plays from a file or clip at a time
+
+        # Persistent output, see set_persistent(). Sources that don't match the stream's rate and
+        # format are converted into __convert_mv, a callback's worth at a time
+        self.__persistent = False
+        self.__out_rate = 0
+        self.__out_channels = 1
+        self.__convert_mv = None
+        self.__convert_step = 0         # Source frames per output frame in 16.16, 0 when not converting
+        self.__convert_phase = array("I", [0])
+        self.__source_bits = 16
+        self.__source_channels = 1
+
+        # Clips preloaded into RAM: name -> (samples, format, sample rate, bits per sample, bytes held),
+        # with their names in least to most recently played order for eviction
+        self.__clip_cache_len = clip_cache_len
+        self.__clips = {}
+        self.__clip_order = []
+        self.__clip_bytes = 0
 
-        # Reserve a variable for audio samples used for tones
+        # The mixer's voices, each None or [samples, frames, channels, gain, loop, position],
+        # and the buffer they are summed into. Set up by start_mixer()
+        self.__voices = []
+        self.__mix_samples = None
+        self.__mix_rate = 0
+
+        # The tone being played as (wavetable, phase step, gain), the phase reached and the buffer
+        # it is rendered into, and the mixer's rendered tones by (frequency, amplitude, waveform, rate)
+        self.__tone = None
+        self.__tone_phase = 0
         self.__tone_samples = None
-        self.__queued_samples = None
+        self.__tone_cache = {}
+        self.__tone_order = []
         self.__volume = 1.0  # Default to full volume
+        self.__gain = WavPlayer.GAIN_ONE
+
+        # Heap accounting for the I2S callback, see set_heap_accounting()
+        self.__heap_accounting = False
+        self.__callbacks = 0
+        self.__callback_alloc_total = 0
+        self.__callback_alloc_max = 0
+
+        # Timing of the I2S callback and the file reads, and underruns, see set_timing()
+        self.set_timing(False)
 
+    # Sets the directory to play files from and indexes the WAV files in it.
+    # Clips already preloaded stay playable by name
     def set_root(self, root):
         self.__root = root.rstrip("/") + "/"
+        self.refresh()
+
+    # Re-reads the index of WAV files under root, after files have been added or removed. Each is indexed
+    # as name -> (file size, format, sample rate, bits per sample, first sample offset, sample size, block align),
+    # where sample size is in bytes of the file and block align is 0 unless the file is IMA-ADPCM
+    def refresh(self):
+        assets = {}
+        for name in os.listdir(self.__root):
+            if not name.lower().endswith(".wav"):
+                continue
+            path = self.__root + name
+            try:
+                with open(path, "rb") as file:
+                    format, sample_rate, bits_per_sample, first_sample_offset, sample_size, block_align = WavPlayer.__parse_wav(file)
+                file_size = os.stat(path)[6]
+                # A data chunk that claims more than the file holds (a truncated or still-recording file) is cut short
+                sample_size = min(sample_size, file_size - first_sample_offset)
+                assets[name] = (file_size, format, sample_rate, bits_per_sample, first_sample_offset, sample_size, block_align)
+            except (OSError, ValueError):
+                pass                                            # Not a file, or not a WAV we can play
+        self.__assets = assets
+
+    # Returns (file size, format, sample rate, bits per sample, first sample offset, sample size, block align) of an indexed file
+    def asset_info(self, wav_file):
+        return self.__assets.get(wav_file)
 
     def play_wav(self, wav_file, loop=False):
-        if os.listdir(self.__root).count(wav_file) == 0:
+        if wav_file in self.__clips:
+            self.__play_clip(wav_file, loop)
+            return
+
+        asset = self.__assets.get(wav_file)
+        if asset is None:
             raise ValueError(f"'{wav_file}' not found")
 
         self.__stop_i2s()                                       # Stop any active playback and terminate the I2S instance
 
+        self.__clip = None
         self.__wav_file = open(self.__root + wav_file, "rb")    # Open the chosen WAV file in read-only, binary mode
         self.__loop_wav = loop                                  # Record if the user wants the file to loop
 
-        # Parse the WAV file, returning the necessary parameters to initialise I2S communication
-        format, sample_rate, bits_per_sample, self.__first_sample_offset, self.sample_size = WavPlayer.__parse_wav(self.__wav_file)
+        # The parameters to initialise I2S communication, parsed from the WAV file when it was indexed
+        _, format, sample_rate, bits_per_sample, self.__first_sample_offset, self.sample_size, block_align = asset
+        self.__channels = 2 if format == I2S.STEREO else 1
+        self.__block_align = block_align
+        if block_align:
+            bits_per_sample = 16                                # IMA-ADPCM is played as 16-bit samples
+        self.__bits_per_sample = bits_per_sample
 
         # Keep a track of total bytes read from WAV File
         self.total_bytes_read = 0
@@ -93,39 +431,147 @@ class WavPlayer:
                          state=WavPlayer.PLAY,
                          mode=WavPlayer.MODE_WAV)
 
-    def play_tone(self, frequency, amplitude):
-        if frequency < 20.0 or frequency > 20_000:
-            raise ValueError("frequency out of range. Expected between 20Hz and 20KHz")
+    # Reads a WAV file's samples into RAM so play_wav() plays it without touching the file system.
+    # The least recently played clips are dropped to keep the total within clip_cache_len
+    def preload(self, wav_file):
+        if wav_file in self.__clips:
+            self.__touch_clip(wav_file)
+            return
 
-        if amplitude < 0.0 or amplitude > 1.0:
-            raise ValueError("amplitude out of range. Expected 0.0 to 1.0")
+        asset = self.__assets.get(wav_file)
+        if asset is None:
+            raise ValueError(f"'{wav_file}' not found")
+
+        _, format, sample_rate, bits_per_sample, first_sample_offset, sample_size, block_align = asset
+        channels = 2 if format == I2S.STEREO else 1
+        held = sample_size
+        if block_align:
+            # IMA-ADPCM clips are held decoded, as 16-bit samples
+            held = WavPlayer.__adpcm_decoded_length(sample_size, block_align, channels)
+            bits_per_sample = 16
+        if held > self.__clip_cache_len:
+            raise ValueError(f"'{wav_file}' is larger than the clip cache")
 
-        # Create a buffer containing the pure tone samples
-        samples_per_cycle = self.TONE_SAMPLE_RATE // frequency
-        sample_size_in_bytes = self.TONE_BITS_PER_SAMPLE // 8
-        samples = bytearray(self.TONE_FULL_WAVES * samples_per_cycle * sample_size_in_bytes)
-        sample_range = pow(2, self.TONE_BITS_PER_SAMPLE) // 2
+        while self.__clip_bytes + held > self.__clip_cache_len:
+            self.unload(self.__clip_order[0])
 
-        format = "<h" if self.TONE_BITS_PER_SAMPLE == 16 else "<l"
+        gc.collect()
+        with open(self.__root + wav_file, "rb") as file:
+            data = bytearray(sample_size)
+            file.seek(first_sample_offset)
+            num_read = file.readinto(data)
+
+        if block_align:
+            samples = bytearray(held)
+            num_read = _decode_ima(data, num_read, block_align, samples, channels, IMA_STEPS) * 2
+            data = None
+        else:
+            samples = data
+        samples = memoryview(samples)[:num_read]
+        sample_size = held
+        self.__clips[wav_file] = (samples, format, sample_rate, bits_per_sample, sample_size)
+        self.__clip_order.append(wav_file)
+        self.__clip_bytes += sample_size
 
-        # Populate the buffer with multiple cycles to avoid it completing too quickly and causing drop outs
-        for i in range(samples_per_cycle * self.TONE_FULL_WAVES):
-            sample = int((sample_range - 1) * (math.sin(2 * math.pi * i / samples_per_cycle)) * amplitude)
-            struct.pack_into(format, samples, i * sample_size_in_bytes, sample)
+    # Drops a preloaded clip. A clip that is playing plays on to its end from the file's samples
+    def unload(self, wav_file):
+        clip = self.__clips.pop(wav_file, None)
+        if clip is not None:
+            self.__clip_order.remove(wav_file)
+            self.__clip_bytes -= clip[4]
+
+    def is_preloaded(self, wav_file):
+        return wav_file in self.__clips
+
+    # Plays a tone, rendered from a wavetable in the callback. A tone that is already playing
+    # changes to the new one on the next callback, without restarting I2S
+    def play_tone(self, frequency, amplitude, waveform=WAVE_SINE):
+        WavPlayer.__check_tone(frequency, amplitude)
+        step = int(frequency * (WAVETABLE_LENGTH << 16) / self.TONE_SAMPLE_RATE)
+        self.__tone = (_wavetable(waveform), step, min(WavPlayer.GAIN_ONE - 1, int(amplitude * WavPlayer.GAIN_ONE)))
 
         # Are we not already playing tones?
         if not (self.__mode == WavPlayer.MODE_TONE and (self.__state == WavPlayer.PLAY or self.__state == WavPlayer.PAUSE)):
             self.__stop_i2s()                                       # Stop any active playback and terminate the I2S instance
-            self.__tone_samples = samples
+            if self.__tone_samples is None:
+                self.__tone_samples = bytearray(self.TONE_BUFFER_LENGTH)
+            self.__tone_phase = 0
             self.__start_i2s(bits=self.TONE_BITS_PER_SAMPLE,
                              format=I2S.MONO,
                              rate=self.TONE_SAMPLE_RATE,
                              state=WavPlayer.PLAY,
                              mode=WavPlayer.MODE_TONE)
         else:
-            self.__queued_samples = samples
             self.__state = WavPlayer.PLAY
 
+    # Keeps the I2S output open as a 16-bit stream at rate in format (I2S.MONO or I2S.STEREO), playing
+    # silence when there is nothing to play. Sounds then start on the next callback instead of after
+    # the peripheral has been set up again, and are converted to the stream's rate and format if need be
+    def set_persistent(self, enabled, rate=TONE_SAMPLE_RATE, format=I2S.MONO):
+        self.__persistent = False
+        self.__stop_i2s()                                       # Stop any active playback and terminate the I2S instance
+        self.__convert_mv = None
+        if not enabled:
+            self.__audio_out = None
+            return
+
+        self.__out_rate = rate
+        self.__out_channels = 2 if format == I2S.STEREO else 1
+        self.__convert_mv = memoryview(bytearray(self.__wav_buf_len))
+        self.__start_i2s(bits=16,
+                         format=format,
+                         rate=rate,
+                         state=WavPlayer.STOP,
+                         mode=WavPlayer.MODE_WAV)
+        self.__persistent = True
+
+    def is_persistent(self):
+        return self.__persistent
+
+    # Opens the I2S output as a 16-bit mono stream at rate that stays open while voices come and go.
+    # Each voice plays a WAV clip or a tone, and all of them are summed into the output.
+    # With persistent output, the mixer runs at the stream's rate whatever rate is given
+    def start_mixer(self, voices=MIX_VOICES, rate=TONE_SAMPLE_RATE):
+        if self.__persistent:
+            rate = self.__out_rate
+        if self.__mode == WavPlayer.MODE_MIX and self.is_playing() and self.__mix_rate == rate and len(self.__voices) == voices:
+            return
+
+        self.__stop_i2s()                                       # Stop any active playback and terminate the I2S instance
+        self.__voices = [None] * voices
+        self.__mix_samples = bytearray(self.MIX_BUFFER_LENGTH)
+        self.__mix_rate = rate
+        self.__start_i2s(bits=16,
+                         format=I2S.MONO,
+                         rate=rate,
+                         state=WavPlayer.PLAY,
+                         mode=WavPlayer.MODE_MIX)
+
+    # Plays a WAV file on a mixer voice, replacing what the voice was playing, from the next callback on.
+    # The file is preloaded if it isn't already, and must be 16-bit at the mixer's rate
+    def play_voice(self, voice, wav_file, volume=1.0, loop=False):
+        if wav_file not in self.__clips:
+            self.preload(wav_file)
+        self.__touch_clip(wav_file)
+
+        samples, format, sample_rate, bits_per_sample, _ = self.__clips[wav_file]
+        if bits_per_sample != 16 or sample_rate != self.__mix_rate:
+            raise ValueError(f"'{wav_file}' is not 16-bit at {self.__mix_rate}Hz")
+
+        channels = 2 if format == I2S.STEREO else 1
+        self.__set_voice(voice, samples, len(samples) // (2 * channels), channels, volume, loop)
+
+    # Plays a tone on a mixer voice until it is stopped
+    def play_voice_tone(self, voice, frequency, amplitude, volume=1.0, waveform=WAVE_SINE):
+        samples = self.__tone_buffer(frequency, amplitude, waveform, self.__mix_rate)
+        self.__set_voice(voice, samples, len(samples) // 2, 1, volume, True)
+
+    def stop_voice(self, voice):
+        self.__voices[voice] = None
+
+    def is_voice_playing(self, voice):
+        return self.__voices[voice] is not None
+
     def pause(self):
         if self.__state == WavPlayer.PLAY:
             self.__state = WavPlayer.PAUSE          # Enter the pause state on the next callback
@@ -141,23 +587,206 @@ class WavPlayer:
                 # It is done in this order to prevent the callback entering the play
                 # state after we close the file but before we change the state)
                 self.__state = WavPlayer.FLUSH
-                self.__wav_file.close()
+                if self.__clip is None:
+                    self.__wav_file.close()
             else:
                 self.__state = WavPlayer.STOP
 
+    # play_wav(), set_persistent() and deinit() block for up to STOP_TIMEOUT_MS while the last sound
+    # flushes. From asyncio code use these, which wait for the flush between awaits instead
+    async def stop_async(self):
+        self.stop()                                 # Stop any active playback
+        while self.is_playing():                    # and let other tasks run until it has flushed
+            await asyncio.sleep_ms(WavPlayer.STOP_POLL_MS)
+
+    async def play_wav_async(self, wav_file, loop=False):
+        await self.stop_async()                     # play_wav() then has nothing left to wait for
+        self.play_wav(wav_file, loop)
+
+    async def deinit_async(self):
+        await self.stop_async()
+        self.deinit()
+
     def is_playing(self):
         return self.__state != WavPlayer.NONE and self.__state != WavPlayer.STOP
 
     def is_paused(self):
         return self.__state == WavPlayer.PAUSE
 
+    def deinit(self):
+        self.__persistent = False
+        self.__stop_i2s()                   # Stop any active playback and release the I2S peripheral
+        self.__audio_out = None
+
     def set_volume(self, volume):
         self.__volume = max(0.0, min(1.0, float(volume)))
+        self.__gain = int(self.__volume * WavPlayer.GAIN_ONE)
 
     def get_volume(self):
         return self.__volume
 
+    def set_heap_accounting(self, enabled):
+        self.__heap_accounting = enabled
+        self.__callbacks = 0
+        self.__callback_alloc_total = 0
+        self.__callback_alloc_max = 0
+
+    # Returns (callbacks, total bytes, most bytes in one callback) allocated by the I2S callback
+    def heap_stats(self):
+        return self.__callbacks, self.__callback_alloc_total, self.__callback_alloc_max
+
+    # Times the I2S callback and the file reads while enabled. Underruns are counted either way
+    def set_timing(self, enabled):
+        self.__timing = enabled
+        self.__timed_callbacks = 0
+        self.__callback_us_total = 0
+        self.__callback_us_max = 0
+        self.__reads = 0
+        self.__read_us_total = 0
+        self.__read_us_max = 0
+        self.__underruns = 0
+        self.__last_underrun_ms = None
+
+    # Returns (callbacks, mean and longest callback in us, reads, mean and longest read in us,
+    # underruns, ticks_ms() of the last underrun or None). An underrun is a callback that had to
+    # play silence because the read scheduled by the one before it had not run yet
+    def timing_stats(self):
+        callbacks, reads = self.__timed_callbacks, self.__reads
+        return (callbacks, self.__callback_us_total // callbacks if callbacks else 0, self.__callback_us_max,
+                reads, self.__read_us_total // reads if reads else 0, self.__read_us_max,
+                self.__underruns, self.__last_underrun_ms)
+
+    def __set_voice(self, voice, samples, frames, channels, volume, loop):
+        if self.__mode != WavPlayer.MODE_MIX or not self.is_playing():
+            raise ValueError("mixer not started")
+        if volume < 0.0 or volume > 1.0:
+            raise ValueError("volume out of range. Expected 0.0 to 1.0")
+
+        gain = min(WavPlayer.GAIN_ONE - 1, int(volume * WavPlayer.GAIN_ONE))
+        self.__voices[voice] = [samples, frames, channels, gain, loop, 0]     # One store, so the callback sees all or nothing
+
+    @staticmethod
+    def __check_tone(frequency, amplitude):
+        if frequency < 20.0 or frequency > 20_000:
+            raise ValueError("frequency out of range. Expected between 20Hz and 20KHz")
+
+        if amplitude < 0.0 or amplitude > 1.0:
+            raise ValueError("amplitude out of range. Expected 0.0 to 1.0")
+
+    # Returns a buffer holding TONE_FULL_WAVES cycles of a tone, from the cache if it has been made before
+    def __tone_buffer(self, frequency, amplitude, waveform, rate):
+        key = (frequency, amplitude, waveform, rate)
+        samples = self.__tone_cache.get(key)
+        if samples is not None:
+            if self.__tone_order[-1] != key:
+                self.__tone_order.remove(key)
+                self.__tone_order.append(key)
+            return samples
+
+        WavPlayer.__check_tone(frequency, amplitude)
+        if len(self.__tone_order) >= self.TONE_CACHE_SIZE:
+            del self.__tone_cache[self.__tone_order.pop(0)]
+
+        # Whole cycles, so the buffer loops without a click
+        samples_per_cycle = int(rate // frequency)
+        count = self.TONE_FULL_WAVES * samples_per_cycle
+        samples = bytearray(count * 2)
+        gain = min(WavPlayer.GAIN_ONE - 1, int(amplitude * WavPlayer.GAIN_ONE))
+        _render_tone(samples, count, _wavetable(waveform), 0, (WAVETABLE_LENGTH << 16) // samples_per_cycle, gain)
+
+        self.__tone_cache[key] = samples
+        self.__tone_order.append(key)
+        return samples
+
+    # Sets up the conversion of a source's samples to the persistent stream's, if they differ, and
+    # how many bytes of them the callback plays at a time so the converted samples fit __convert_mv
+    def __set_source(self, bits, channels, rate):
+        self.__source_bits = bits
+        self.__source_channels = channels
+        self.__convert_phase[0] = 0
+        if not self.__persistent or (bits == 16 and channels == self.__out_channels and rate == self.__out_rate):
+            self.__convert_step = 0
+            self.__chunk_len = self.__wav_buf_len
+            return
+
+        self.__convert_step = (rate << 16) // self.__out_rate
+        frame_bytes = bits // 8 * channels
+        out_frames = len(self.__convert_mv) // (2 * self.__out_channels) - 1
+        frames = min(out_frames * rate // self.__out_rate, self.__wav_buf_len // frame_bytes)
+        self.__chunk_len = frames * frame_bytes
+
+    # Writes samples from the current source to I2S, converting them for the persistent stream if need be
+    def __write(self, samples):
+        if self.__convert_step:
+            frames = len(samples) // (self.__source_bits // 8 * self.__source_channels)
+            frames = _convert(samples, frames, self.__source_channels, self.__source_bits,
+                              self.__convert_mv, self.__out_channels, self.__convert_step, self.__convert_phase)
+            samples = self.__convert_mv[:frames * 2 * self.__out_channels]
+        self.__audio_out.write(samples)
+
+    # Makes the buffer whole IMA-ADPCM blocks are read into, as many as decode into one WAV buffer
+    def __prepare_adpcm(self, block_align):
+        decoded = WavPlayer.__adpcm_decoded_length(block_align, block_align, self.__channels)
+        blocks = self.__chunk_len // decoded
+        if blocks == 0:
+            raise ValueError("IMA-ADPCM blocks too large to decode")
+        if self.__adpcm_mv is None or len(self.__adpcm_mv) != blocks * block_align:
+            self.__adpcm_mv = memoryview(bytearray(blocks * block_align))
+
+    # Returns how many bytes of 16-bit samples length bytes of IMA-ADPCM blocks decode to
+    @staticmethod
+    def __adpcm_decoded_length(length, block_align, channels):
+        blocks, last = divmod(length, block_align)
+        frames_per_block = (block_align - 4 * channels) * 2 // channels + 1
+        frames = blocks * frames_per_block
+        if last >= 4 * channels:
+            frames += (last - 4 * channels) // (4 * channels) * 8 + 1
+        return frames * channels * 2
+
+    def __play_clip(self, wav_file, loop):
+        self.__stop_i2s()                                       # Stop any active playback and terminate the I2S instance
+        self.__touch_clip(wav_file)
+
+        samples, format, sample_rate, bits_per_sample, _ = self.__clips[wav_file]
+        self.__clip = samples
+        self.__wav_file = None
+        self.__block_align = 0
+        self.__loop_wav = loop
+        self.__bits_per_sample = bits_per_sample
+        self.sample_size = len(samples)
+        self.total_bytes_read = 0
+
+        self.__start_i2s(bits=bits_per_sample,
+                         format=format,
+                         rate=sample_rate,
+                         state=WavPlayer.PLAY,
+                         mode=WavPlayer.MODE_WAV)
+
+    # Moves a clip to the most recently played end of the eviction order
+    def __touch_clip(self, wav_file):
+        order = self.__clip_order
+        if order[-1] != wav_file:
+            order.remove(wav_file)
+            order.append(wav_file)
+
     def __start_i2s(self, bits=16, format=I2S.MONO, rate=44_100, state=STOP, mode=MODE_WAV):
+        self.__set_source(bits, 2 if format == I2S.STEREO else 1, rate)
+        if mode == WavPlayer.MODE_WAV and self.__clip is None and self.__wav_file is not None:
+            if self.__block_align:
+                self.__prepare_adpcm(self.__block_align)        # IMA-ADPCM is read a whole number of blocks at a time
+            if self.__spare_samples_mv is None:
+                self.__spare_samples_mv = memoryview(bytearray(self.__wav_buf_len))
+            # A persistent stream may still be sending the last section written, so read into the other buffer
+            self.__next_mv = self.__spare_samples_mv if self.__sent_mv is self.__wav_samples_mv else self.__wav_samples_mv
+            self.__read_ahead()                                 # so the first callback has samples to write
+
+        if self.__persistent:
+            # The stream is already open, so the next callback plays from the new source
+            self.__mode = mode
+            self.__flush_count = self.__ibuf_len // self.SILENCE_BUFFER_LENGTH + 1
+            self.__state = state
+            return
+
         import gc
         gc.collect()
         self.__audio_out = I2S(
@@ -182,9 +811,20 @@ class WavPlayer:
             self.__enable.on()
 
     def __stop_i2s(self):
+        if self.__persistent:
+            # Leave the stream open, playing silence from the next callback on
+            self.__state = WavPlayer.STOP
+            if self.__mode == WavPlayer.MODE_WAV and self.__clip is None and self.__wav_file is not None:
+                self.__wav_file.close()
+            self.__wav_file = None
+            return
+
         self.stop()                     # Stop any active playback
-        while self.is_playing():        # and wait for it to complete
-            pass
+        # and wait for it to flush, for at most STOP_TIMEOUT_MS. This blocks, the *_async methods
+        # stop first and let other tasks run meanwhile so there is nothing left to wait for here
+        deadline = time.ticks_add(time.ticks_ms(), WavPlayer.STOP_TIMEOUT_MS)
+        while self.is_playing() and time.ticks_diff(deadline, time.ticks_ms()) > 0:
+            time.sleep_ms(1)
 
         if self.__enable is not None:
             self.__enable.off()
@@ -195,40 +835,44 @@ class WavPlayer:
         self.__state == WavPlayer.NONE  # Return to the none state
 
     def __i2s_callback(self, arg):
+        if self.__timing:
+            started = time.ticks_us()
+            self.__account(arg)
+            elapsed = time.ticks_diff(time.ticks_us(), started)
+            self.__timed_callbacks += 1
+            self.__callback_us_total += elapsed
+            if elapsed > self.__callback_us_max:
+                self.__callback_us_max = elapsed
+        else:
+            self.__account(arg)
+
+    def __account(self, arg):
+        if self.__heap_accounting:
+            heap_before = gc.mem_alloc()
+            self.__fill(arg)
+            allocated = gc.mem_alloc() - heap_before
+            if allocated > 0:                               # Negative if a collection ran meanwhile
+                self.__callback_alloc_total += allocated
+                if allocated > self.__callback_alloc_max:
+                    self.__callback_alloc_max = allocated
+            self.__callbacks += 1
+        else:
+            self.__fill(arg)
+
+    def __fill(self, arg):
         # PLAY
         if self.__state == WavPlayer.PLAY:
-            if self.__mode == WavPlayer.MODE_WAV:
-                num_read = self.__wav_file.readinto(self.__wav_samples_mv)      # Read the next section of the WAV file
-                self.total_bytes_read += num_read
-                # Software volume control: scale 16-bit PCM samples in-place
-                if num_read > 0 and self.__volume < 0.99:
-                    # Only scale if not full volume
-                    import struct
-                    for i in range(0, num_read, 2):
-                        sample = struct.unpack_from('<h', self.__wav_samples_mv, i)[0]
-                        scaled = int(sample * self.__volume)
-                        # Clamp to 16-bit signed range
-                        scaled = max(-32768, min(32767, scaled))
-                        struct.pack_into('<h', self.__wav_samples_mv, i, scaled)
-                # Have we reached the end of the file?
-                if num_read == 0:
-                    # Do we want to loop the WAV playback?
-                    if self.__loop_wav:
-                        _ = self.__wav_file.seek(self.__first_sample_offset)    # Play again, so advance to first byte of sample data
-                    else:
-                        self.__wav_file.close()                                 # Stop playing, so close the file
-                        self.__state = WavPlayer.FLUSH                          # and enter the flush state on the next callback
-
-                    self.__audio_out.write(self.__silence_samples)              # In both cases play silence to end this callback
-                else:
-                    if num_read > 0 and num_read < self.WAV_BUFFER_LENGTH:
-                        num_read = num_read - (self.total_bytes_read - self.sample_size)
-                    self.__audio_out.write(self.__wav_samples_mv[: num_read])   # We are within the file, so write out the next audio samples
+            if self.__mode == WavPlayer.MODE_MIX:
+                self.__fill_from_voices()
+            elif self.__mode == WavPlayer.MODE_WAV and self.__clip is not None:
+                self.__fill_from_clip()
+            elif self.__mode == WavPlayer.MODE_WAV:
+                self.__fill_from_file()
             else:
-                if self.__queued_samples is not None:
-                    self.__tone_samples = self.__queued_samples
-                    self.__queued_samples = None
-                self.__audio_out.write(self.__tone_samples)
+                table, step, gain = self.__tone
+                samples = self.__tone_samples
+                self.__tone_phase = _render_tone(samples, len(samples) >> 1, table, self.__tone_phase, step, gain)
+                self.__write(samples)
 
         # PAUSE or STOP
         elif self.__state == WavPlayer.PAUSE or self.__state == WavPlayer.STOP:
@@ -248,47 +892,184 @@ class WavPlayer:
         elif self.__state == WavPlayer.NONE:
             pass
 
+    def __fill_from_file(self):
+        num_read = self.__prefetched
+        if num_read < 0:
+            # The read scheduled by the last callback hasn't run, so there is nothing to play
+            self.__underruns += 1
+            self.__last_underrun_ms = time.ticks_ms()
+            self.__audio_out.write(self.__silence_samples)
+        elif num_read == 0:
+            # The end of the file (a looping file has already gone back to its start)
+            self.__wav_file.close()                                     # Stop playing, so close the file
+            self.__state = WavPlayer.FLUSH                              # and enter the flush state on the next callback
+            self.__audio_out.write(self.__silence_samples)              # Play silence to end this callback
+        else:
+            samples = self.__next_mv
+            if num_read == len(samples):
+                self.__write(samples)                                   # We are within the file, so write out the next audio samples
+            else:
+                self.__write(samples[:num_read])
+            # The other buffer's write completed with this callback, so the next section can go there
+            self.__sent_mv = samples
+            self.__next_mv = self.__spare_samples_mv if samples is self.__wav_samples_mv else self.__wav_samples_mv
+            self.__prefetched = -1
+            try:
+                micropython.schedule(self.__prefetch_ref, None)         # Read the next section once this callback is done
+            except RuntimeError:
+                self.__read_ahead()                                     # The schedule queue is full, read it now
+
+    # Scheduled by the callback to read the next section of the WAV file
+    def __prefetch(self, _):
+        # Playback may have been stopped, and the file closed, since it was scheduled
+        if self.__prefetched < 0 and self.__clip is None and self.__mode == WavPlayer.MODE_WAV \
+                and (self.__state == WavPlayer.PLAY or self.__state == WavPlayer.PAUSE):
+            self.__read_ahead()
+
+    # Reads the next section of the WAV file into __next_mv, stopping at the end of the data chunk,
+    # and leaves the number of bytes of samples it holds in __prefetched
+    def __read_ahead(self):
+        started = time.ticks_us()
+        num_read = self.__read_section()
+        if num_read == 0 and self.__loop_wav and self.sample_size > 0:
+            _ = self.__wav_file.seek(self.__first_sample_offset)        # Play again, so advance to first byte of sample data
+            self.total_bytes_read = 0
+            num_read = self.__read_section()
+
+        # IMA-ADPCM blocks are decoded into the WAV buffer
+        samples = self.__next_mv
+        if num_read > 0 and self.__block_align:
+            num_read = _decode_ima(self.__adpcm_mv, num_read, self.__block_align, samples, self.__channels, IMA_STEPS) * 2
+        # Software volume control: scale the PCM samples in-place, unless at full volume
+        if num_read > 0 and self.__gain < WavPlayer.FULL_GAIN:
+            self.__scale(samples, num_read)
+        self.__prefetched = num_read
+
+        if self.__timing:
+            elapsed = time.ticks_diff(time.ticks_us(), started)
+            self.__reads += 1
+            self.__read_us_total += elapsed
+            if elapsed > self.__read_us_max:
+                self.__read_us_max = elapsed
+
+    def __read_section(self):
+        read_mv = self.__adpcm_mv if self.__block_align else self.__next_mv
+        remaining = min(self.sample_size - self.total_bytes_read, len(read_mv) if self.__block_align else self.__chunk_len)
+        if remaining == len(read_mv):
+            num_read = self.__wav_file.readinto(read_mv)
+        elif remaining > 0:
+            num_read = self.__wav_file.readinto(read_mv[:remaining])
+        else:
+            num_read = 0
+        self.total_bytes_read += num_read
+        return num_read
+
+    def __fill_from_clip(self):
+        start = self.total_bytes_read
+        num_read = min(self.__chunk_len, self.sample_size - start)
+        self.total_bytes_read = start + num_read
+
+        if num_read == 0:
+            if self.__loop_wav:
+                self.total_bytes_read = 0                                   # Play again from the first sample
+            else:
+                self.__state = WavPlayer.FLUSH                              # Enter the flush state on the next callback
+            self.__audio_out.write(self.__silence_samples)                  # In both cases play silence to end this callback
+        elif self.__gain < WavPlayer.FULL_GAIN:
+            # Scale a copy, so the cached samples stay at full volume
+            self.__wav_samples_mv[:num_read] = self.__clip[start:start + num_read]
+            self.__scale(self.__wav_samples_mv, num_read)
+            self.__write(self.__wav_samples_mv[:num_read])
+            self.__sent_mv = self.__wav_samples_mv
+        else:
+            self.__write(self.__clip[start:start + num_read])              # Straight from the cached samples
+
+    def __fill_from_voices(self):
+        out = self.__mix_samples
+        count = len(out) >> 1
+        _clear_16bit(out, count)
+
+        voices = self.__voices
+        for index in range(len(voices)):
+            voice = voices[index]
+            if voice is None:
+                continue
+            samples, frames, channels, gain, loop, position = voice
+            if self.__gain < WavPlayer.FULL_GAIN:
+                gain = (gain * self.__gain) >> 16
+
+            filled = 0
+            while filled < count:
+                mixed = min(count - filled, frames - position)
+                if mixed > 0:
+                    _mix_16bit(out, filled, samples, position, mixed, gain, channels)
+                    filled += mixed
+                    position += mixed
+                if position >= frames:
+                    if not loop or frames == 0:
+                        if voices[index] is voice:                  # Unless a new one has just replaced it
+                            voices[index] = None
+                        break
+                    position = 0
+            voice[5] = position
+
+        self.__write(out)
+
+    # Scales the first num_read bytes of samples by the volume
+    def __scale(self, samples, num_read):
+        if self.__bits_per_sample == 16:
+            _scale_16bit(samples, num_read >> 1, self.__gain)
+        elif self.__bits_per_sample == 8:
+            _scale_8bit(samples, num_read, self.__gain)
+
     @staticmethod
     def __parse_wav(wav_file):
-        chunk_ID = wav_file.read(4)
-        if chunk_ID != b"RIFF":
+        # Walks the RIFF chunks, reading only their headers, until it reaches the data chunk.
+        # Other chunks (LIST, fact, ...) may come before it and are skipped over
+        header = wav_file.read(12)
+        if header[:4] != b"RIFF":
             raise ValueError("WAV chunk ID invalid")
-        _ = wav_file.read(4)                            # chunk_size
-        format = wav_file.read(4)
-        if format != b"WAVE":
+        if header[8:12] != b"WAVE":
             raise ValueError("WAV format invalid")
-        sub_chunk1_ID = wav_file.read(4)
-        if sub_chunk1_ID != b"fmt ":
-            raise ValueError("WAV sub chunk 1 ID invalid")
-        _ = wav_file.read(4)                            # sub_chunk1_size
-        _ = struct.unpack("<H", wav_file.read(2))[0]    # audio_format
-        num_channels = struct.unpack("<H", wav_file.read(2))[0]
+
+        offset = 12
+        fmt = None
+        while True:
+            chunk = wav_file.read(8)
+            if len(chunk) < 8:
+                raise ValueError("WAV data chunk not found")
+            chunk_ID = chunk[:4]
+            chunk_size = struct.unpack_from("<I", chunk, 4)[0]
+            offset += 8
+
+            if chunk_ID == b"fmt ":
+                if chunk_size < 16:
+                    raise ValueError("WAV fmt chunk invalid")
+                fmt = struct.unpack("<HHIIHH", wav_file.read(16))
+            elif chunk_ID == b"data":
+                if fmt is None:
+                    raise ValueError("WAV fmt chunk not found before data")
+                break
+
+            offset += chunk_size + (chunk_size & 1)     # Chunks are padded to an even length
+            wav_file.seek(offset)
+
+        audio_format, num_channels, sample_rate, _, block_align, bits_per_sample = fmt     # byte_rate unused
+        if audio_format == WavPlayer.WAVE_FORMAT_IMA_ADPCM:
+            if bits_per_sample != 4 or num_channels > 2 or block_align <= 4 * num_channels:
+                raise ValueError("WAV IMA-ADPCM format not supported")
+        elif audio_format == 1 or audio_format == 0xFFFE:
+            block_align = 0
+        else:
+            raise ValueError("WAV audio format not PCM or IMA-ADPCM")
 
         if num_channels == 1:
             format = I2S.MONO
         else:
             format = I2S.STEREO
 
-        sample_rate = struct.unpack("<I", wav_file.read(4))[0]
         # if sample_rate != 44_100 and sample_rate != 48_000:
         #    raise ValueError(f"WAV sample rate of {sample_rate} invalid. Only 44.1KHz or 48KHz audio are supported")
 
-        _ = struct.unpack("<I", wav_file.read(4))[0]    # byte_rate
-        _ = struct.unpack("<H", wav_file.read(2))[0]    # block_align
-        bits_per_sample = struct.unpack("<H", wav_file.read(2))[0]
-
-        # usually the sub chunk2 ID ("data") comes next, but
-        # some online MP3->WAV converters add
-        # binary data before "data".  So, read a fairly large
-        # block of bytes and search for "data".
-
-        binary_block = wav_file.read(200)
-        offset = binary_block.find(b"data")
-        if offset == -1:
-            raise ValueError("WAV sub chunk 2 ID not found")
-
-        wav_file.seek(40)
-        sub_chunk2_size = struct.unpack("<I", wav_file.read(4))[0]
-
-        return (format, sample_rate, bits_per_sample, 44 + offset, sub_chunk2_size)
+        return (format, sample_rate, bits_per_sample, offset, chunk_size, block_align)
 
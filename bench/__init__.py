@@ -0,0 +1,192 @@
+"""
+Throughput benchmarks for the effects, run headless against the host backend.
+
+Each effect is loaded the way main.py loads it and driven through a fixed number of frames
+on the virtual clock, at its own FPS, with random seeded and the buttons pressed on a
+script, so every run draws the same frames. Two passes are made over the same frames:
+
+    fps                 frames per second of draw() + update(), best of TIMING_RUNS
+    calls_per_frame     PicoGraphics calls made by draw()
+    pens_per_frame      create_pen() calls made by draw(), after init()
+    bytes_per_frame     peak heap growth within a draw(), as traced by tracemalloc
+
+fps depends on the machine, the other three don't and should only change with the code.
+The heap figures are CPython's, not MicroPython's, so compare them with a baseline rather
+than with the device. python -m bench --save writes the results to BASELINE, --compare
+prints them next to it and exits non-zero on a regression in the three that don't depend on
+the machine. --fps gates fps too, for comparing against a baseline saved on the same machine.
+"""
+
+import gc
+import os
+import sys
+import time
+import random
+import asyncio
+import tracemalloc
+
+import host
+
+EFFECTS = (
+    "fire",
+    "supercomputer",
+    "rainbow",
+    "traffic_lights",
+    "stars",
+    "scrolling_text",
+    "alphabet_sequence",
+    "elevator",
+    "today",
+)
+
+FRAMES = 600
+SEED = 1234
+TIMING_RUNS = 3
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# the RTC today draws from, so its frames don't depend on the day the benchmark runs
+RTC_DATETIME = (2025, 1, 6, 0, 12, 0, 0, 0)
+
+# frames held per scripted press, long enough to get past the debounce at any FPS
+PRESS_FRAMES = 4
+
+# effect -> ((frame, switch name), ...) pressed on those frames
+SCRIPTS = {
+    "elevator": ((120, "SWITCH_A"), (360, "SWITCH_A")),
+}
+
+# with --fps, a fps drop beyond this fraction of the baseline counts as a regression. Runs on
+# one machine still vary by a third or so, this only catches an effect getting much slower
+FPS_TOLERANCE = 0.5
+# and heap growth beyond this many bytes per frame, which is above tracemalloc's own noise
+BYTES_TOLERANCE = 16
+
+GRAPHICS_CALLS = (
+    "clear", "pixel", "pixel_span", "line", "rectangle", "circle", "triangle", "text",
+    "measure_text", "set_pen", "set_font", "set_clip", "remove_clip",
+)
+PEN_CALLS = ("create_pen", "create_pen_hsv")
+
+
+# PicoGraphics that counts the calls made to it
+def counting_graphics():
+    from picographics import PicoGraphics, DISPLAY_COSMIC_UNICORN
+
+    def counted(name, counter):
+        method = getattr(PicoGraphics, name)
+
+        def call(self, *args, **kwargs):
+            setattr(self, counter, getattr(self, counter) + 1)
+            return method(self, *args, **kwargs)
+        return call
+
+    members = {name: counted(name, "calls") for name in GRAPHICS_CALLS}
+    members.update({name: counted(name, "pens") for name in PEN_CALLS})
+    members["calls"] = 0
+    members["pens"] = 0
+    return type("CountingGraphics", (PicoGraphics,), members)(DISPLAY_COSMIC_UNICORN)
+
+
+class Run:
+    def __init__(self, name, counting):
+        clock = host.install()
+        from cosmic import CosmicUnicorn
+        from buttons import Buttons, PRESS
+        import machine
+
+        random.seed(SEED)
+        machine.RTC().datetime(RTC_DATETIME)
+        sys.modules.pop(name, None)
+
+        self.clock = clock
+        self.cu = CosmicUnicorn()
+        self.buttons = Buttons(self.cu)
+        self.press = PRESS
+        graphics = counting_graphics() if counting else None
+        self.effect = host.load_effect(name, self.cu, graphics)
+        self.period_us = 1_000_000 // getattr(self.effect, "FPS", 30)
+        self.script = [(frame, getattr(CosmicUnicorn, switch)) for frame, switch in SCRIPTS.get(name, ())]
+
+    # presses and releases the scripted buttons and hands presses to on_button() like main.py
+    def input(self, frame):
+        for start, switch in self.script:
+            if frame == start:
+                self.cu.press(switch)
+            elif frame == start + PRESS_FRAMES:
+                self.cu.release(switch)
+        self.buttons.poll()
+        while self.buttons.pending():
+            switch, kind = self.buttons.next_event()
+            if kind == self.press and hasattr(self.effect, "on_button"):
+                self.effect.on_button(switch)
+
+    def frame(self, frame):
+        self.input(frame)
+        self.effect.draw()
+        self.cu.update(self.effect.graphics)
+        self.clock.advance_us(self.period_us)
+
+    def close(self):
+        if hasattr(self.effect, "teardown"):
+            pending = self.effect.teardown()
+            if pending is not None:
+                asyncio.run(pending)
+        sys.modules.pop(self.effect.__name__, None)
+
+
+def measure(name, frames=FRAMES):
+    elapsed = None
+    for _ in range(TIMING_RUNS):
+        run = Run(name, counting=False)
+        gc.collect()
+        started = time.perf_counter()
+        for frame in range(frames):
+            run.frame(frame)
+        duration = time.perf_counter() - started
+        run.close()
+        if elapsed is None or duration < elapsed:
+            elapsed = duration
+
+    run = Run(name, counting=True)
+    graphics = run.effect.graphics
+    graphics.calls = 0
+    graphics.pens = 0
+    peak = 0
+    tracemalloc.start()
+    try:
+        for frame in range(frames):
+            run.input(frame)
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            run.effect.draw()
+            peak += tracemalloc.get_traced_memory()[1] - before
+            run.cu.update(graphics)
+            run.clock.advance_us(run.period_us)
+    finally:
+        tracemalloc.stop()
+    run.close()
+
+    return {
+        "frames": frames,
+        "fps": round(frames / elapsed, 1) if elapsed else 0.0,
+        "calls_per_frame": round(graphics.calls / frames, 2),
+        "pens_per_frame": round(graphics.pens / frames, 2),
+        "bytes_per_frame": round(peak / frames, 1),
+    }
+
+
+# returns a list of (effect, metric, baseline, now) that got worse, fps only if asked for
+def regressions(results, baseline, fps=False):
+    worse = []
+    for name, now in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if fps and now["fps"] < before["fps"] * (1 - FPS_TOLERANCE):
+            worse.append((name, "fps", before["fps"], now["fps"]))
+        for metric in ("calls_per_frame", "pens_per_frame"):
+            if now[metric] > before[metric]:
+                worse.append((name, metric, before[metric], now[metric]))
+        if now["bytes_per_frame"] > before["bytes_per_frame"] + BYTES_TOLERANCE:
+            worse.append((name, "bytes_per_frame", before["bytes_per_frame"], now["bytes_per_frame"]))
+    return worse
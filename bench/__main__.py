@@ -0,0 +1,50 @@
+import sys
+import json
+import argparse
+
+import bench
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Benchmark the effects headless.")
+    parser.add_argument("effects", nargs="*", default=bench.EFFECTS, help="effects to run (default: all)")
+    parser.add_argument("--frames", type=int, default=bench.FRAMES)
+    parser.add_argument("--save", action="store_true", help="write the results as the baseline")
+    parser.add_argument("--compare", action="store_true", help="compare with the baseline")
+    parser.add_argument("--fps", action="store_true", help="count fps drops as regressions too (same machine only)")
+    parser.add_argument("--baseline", default=bench.BASELINE, help="baseline file (default: bench/baseline.json)")
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if args.compare:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["effects"]
+
+    results = {}
+    print("effect                  fps  calls/frame  pens/frame  bytes/frame")
+    for name in args.effects:
+        result = bench.measure(name, args.frames)
+        results[name] = result
+        print("{:<18}{:>9}{:>13}{:>12}{:>13}".format(
+            name, result["fps"], result["calls_per_frame"], result["pens_per_frame"], result["bytes_per_frame"]))
+        before = baseline.get(name)
+        if before is not None:
+            print("{:<18}{:>9}{:>13}{:>12}{:>13}".format(
+                "  baseline", before["fps"], before["calls_per_frame"], before["pens_per_frame"], before["bytes_per_frame"]))
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump({"frames": args.frames, "seed": bench.SEED, "effects": results}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print("saved", args.baseline)
+
+    if args.compare:
+        worse = bench.regressions(results, baseline, args.fps)
+        for name, metric, before, now in worse:
+            print("! {} {}: {} -> {}".format(name, metric, before, now))
+        return 1 if worse else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,99 @@
+"""
+Debounced button events for the Cosmic Unicorn.
+
+Buttons.poll() samples every switch once per tick and pushes PRESS, RELEASE and LONG_PRESS
+events into a fixed size ring buffer. main.py (and the standalone effect loops) poll once
+per tick and then read events with next_event() or the debounced state with is_held(),
+instead of calling is_pressed() and sleeping to debounce wherever a button matters.
+"""
+
+import time
+from cosmic import CosmicUnicorn
+
+# Event kinds
+PRESS = 0
+RELEASE = 1
+LONG_PRESS = 2
+
+SWITCHES = (
+    CosmicUnicorn.SWITCH_A,
+    CosmicUnicorn.SWITCH_B,
+    CosmicUnicorn.SWITCH_C,
+    CosmicUnicorn.SWITCH_D,
+    CosmicUnicorn.SWITCH_SLEEP,
+    CosmicUnicorn.SWITCH_VOLUME_UP,
+    CosmicUnicorn.SWITCH_VOLUME_DOWN,
+    CosmicUnicorn.SWITCH_BRIGHTNESS_UP,
+    CosmicUnicorn.SWITCH_BRIGHTNESS_DOWN,
+)
+
+DEBOUNCE_MS = 30        # how long a switch must read the same before it counts
+LONG_PRESS_MS = 800     # how long a switch must be held for a LONG_PRESS event
+QUEUE_LENGTH = 16       # events kept before the oldest are dropped
+
+
+class Buttons:
+    def __init__(self, cu, switches=SWITCHES):
+        self.__cu = cu
+        self.__switches = switches
+
+        count = len(switches)
+        self.__raw = bytearray(count)           # last sample of each switch
+        self.__held = bytearray(count)          # debounced state of each switch
+        self.__long = bytearray(count)          # LONG_PRESS already sent for this hold
+        self.__changed_at = [0] * count         # when the raw sample last changed
+        self.__pressed_at = [0] * count         # when the debounced press started
+
+        # Ring buffer of events, each stored as (switch index << 2) | kind
+        self.__queue = bytearray(QUEUE_LENGTH)
+        self.__head = 0
+        self.__count = 0
+
+    def poll(self, now=None):
+        if now is None:
+            now = time.ticks_ms()
+        for i in range(len(self.__switches)):
+            raw = 1 if self.__cu.is_pressed(self.__switches[i]) else 0
+            if raw != self.__raw[i]:
+                self.__raw[i] = raw
+                self.__changed_at[i] = now
+            elif raw != self.__held[i]:
+                if time.ticks_diff(now, self.__changed_at[i]) >= DEBOUNCE_MS:
+                    self.__held[i] = raw
+                    if raw:
+                        self.__pressed_at[i] = now
+                        self.__long[i] = 0
+                        self.__push(i, PRESS)
+                    else:
+                        self.__push(i, RELEASE)
+            elif raw and not self.__long[i]:
+                if time.ticks_diff(now, self.__pressed_at[i]) >= LONG_PRESS_MS:
+                    self.__long[i] = 1
+                    self.__push(i, LONG_PRESS)
+
+    def pending(self):
+        return self.__count
+
+    # returns the oldest (switch, kind) event, or None if there are none
+    def next_event(self):
+        if self.__count == 0:
+            return None
+        event = self.__queue[self.__head]
+        self.__head = (self.__head + 1) % QUEUE_LENGTH
+        self.__count -= 1
+        return self.__switches[event >> 2], event & 3
+
+    def clear(self):
+        self.__head = 0
+        self.__count = 0
+
+    def is_held(self, switch):
+        return self.__held[self.__switches.index(switch)] == 1
+
+    def __push(self, index, kind):
+        if self.__count == QUEUE_LENGTH:
+            # full, drop the oldest event
+            self.__head = (self.__head + 1) % QUEUE_LENGTH
+            self.__count -= 1
+        self.__queue[(self.__head + self.__count) % QUEUE_LENGTH] = (index << 2) | kind
+        self.__count += 1
@@ -1,16 +1,27 @@
 import time
+import asyncio
 import machine
 from cosmic import CosmicUnicorn
 from picographics import PicoGraphics, DISPLAY_COSMIC_UNICORN as DISPLAY
 from audio import WavPlayer
+from pens import cache_for
+from buttons import Buttons, PRESS
 
 # Volume settings
 VOLUME_HIGH = 0.5
 VOLUME_LOW = 0.2
 
-sound = WavPlayer(0, 10, 11, 9, amp_enable=22)
-sound.set_volume(VOLUME_LOW)
-cosmic = CosmicUnicorn()
+sound = None
+# audio heap and timing accounting, switched on by main.py's profiler
+profiling = False
+# mixer voice each sound plays on, so a beep doesn't cut the doorbell off
+VOICES = {"buttonbeep.wav": 0, "doorbell.wav": 1}
+# the mixer plays clips from RAM, so the sounds are streamed from flash one at a time instead
+# if they couldn't all be preloaded
+mixing = False
+# sound draw() wants played next, task() starts it so draw() never reads a sound file
+next_sound = None
+sound_queued = asyncio.Event()
 '''
 Display scrolling wisdom, quotes or greetz.
 
@@ -18,9 +29,6 @@ You can adjust the brightness with LUX + and -.
 '''
 
 
-# returns the id of the button that is currently pressed or
-# None if none are
-
 # constants for controlling scrolling text
 PADDING = 5
 MESSAGE_COLOUR = (255, 0, 0)
@@ -28,15 +36,18 @@ OUTLINE_COLOUR = (200, 200, 200)
 BACKGROUND_COLOUR = (0, 0, 0)
 HOLD_TIME_S = 2.0
 STEP_TIME = 0.05
+HOLD_TIME_MS = int(HOLD_TIME_S * 1000)
+STEP_TIME_MS = int(STEP_TIME * 1000)
+FPS = 20  # frame rate main.py runs draw() at
 
-# create cosmic object and graphics surface for drawing
-cu = CosmicUnicorn()
-graphics = PicoGraphics(DISPLAY)
+# cosmic object and graphics surface for drawing, set by main.py (or main() below)
+cu = None
+graphics = None
 
-# Basic settings
-graphics.set_font("bitmap8")
-cu.set_brightness(0.8)
-cu.set_volume(VOLUME_LOW)
+# Pens, resolved in init() for whichever graphics surface we are drawing to
+MESSAGE_PEN = None
+OUTLINE_PEN = None
+BACKGROUND_PEN = None
 
 width = CosmicUnicorn.WIDTH
 height = CosmicUnicorn.HEIGHT
@@ -46,20 +57,9 @@ STATE_START_FLOOR = -1
 STATE_TARGET_FLOOR = 10
 STATE_DIRECTION = 0
 
-def pressed():
-    if cu.is_pressed(CosmicUnicorn.SWITCH_A):
-        return CosmicUnicorn.SWITCH_A
-    if cu.is_pressed(CosmicUnicorn.SWITCH_B):
-        return CosmicUnicorn.SWITCH_B
-    if cu.is_pressed(CosmicUnicorn.SWITCH_C):
-        return CosmicUnicorn.SWITCH_C
-    if cu.is_pressed(CosmicUnicorn.SWITCH_D):
-        return CosmicUnicorn.SWITCH_D
-    return None
-
 
 def draw_text(text, x, y):
-    graphics.set_pen(graphics.create_pen(int(MESSAGE_COLOUR[0]), int(MESSAGE_COLOUR[1]), int(MESSAGE_COLOUR[2])))
+    graphics.set_pen(MESSAGE_PEN)
     graphics.text(text, x, y, wordwrap=-1, scale=2)
 
 
@@ -77,26 +77,98 @@ def draw_text(text, x, y):
 # calculate the message width so scrolling can happen
 # msg_width = graphics.measure_text(MESSAGE, 1)
 
-last_time = time.ticks_ms()
-
-while True:
-    # if A, B, C, or D are pressed then reset
-    if cu.is_pressed(CosmicUnicorn.SWITCH_A):
-        # Reverse direction by swapping current and target floor
-        STATE_START_FLOOR, STATE_TARGET_FLOOR = STATE_TARGET_FLOOR, STATE_START_FLOOR
-        STATE_CURRENT_FLOOR = STATE_START_FLOOR
-        last_time = time.ticks_ms()
-        time.sleep(0.2)  # debounce
-    elif pressed() is not None:
-        machine.reset()
-    time_ms = time.ticks_ms()
+last_time = 0
+# text of the floor on display, only rebuilt when the floor changes
+floor_str = ''
+floor_str_for = None
+
+
+def init():
+    global sound, profiling, mixing, MESSAGE_PEN, OUTLINE_PEN, BACKGROUND_PEN
+    global STATE_CURRENT_FLOOR, STATE_START_FLOOR, STATE_TARGET_FLOOR, STATE_DIRECTION, last_time
+    sound = WavPlayer(0, 10, 11, 9, amp_enable=22)
+    sound.set_volume(VOLUME_LOW)
+    profiling = False
+    # the floor sounds play often, keep them in RAM so they mix and start without reading flash
+    mixing = True
+    for wav_file in VOICES:
+        try:
+            sound.preload(wav_file)
+        except (ValueError, MemoryError) as e:
+            print("elevator: streaming the sounds, {} can't be preloaded: {}".format(wav_file, e))
+            mixing = False
+    if mixing:
+        sound.start_mixer(voices=len(VOICES))
+    else:
+        for wav_file in VOICES:
+            sound.unload(wav_file)
+
+    pens = cache_for(graphics)
+    MESSAGE_PEN = pens.get(*MESSAGE_COLOUR, pinned=True)
+    OUTLINE_PEN = pens.get(*OUTLINE_COLOUR, pinned=True)
+    BACKGROUND_PEN = pens.get(*BACKGROUND_COLOUR, pinned=True)
+
+    # Basic settings
+    graphics.set_font("bitmap8")
+    cu.set_volume(VOLUME_LOW)
+
+    STATE_CURRENT_FLOOR = -1
+    STATE_START_FLOOR = -1
+    STATE_TARGET_FLOOR = 10
+    STATE_DIRECTION = 0
+    last_time = time.ticks_ms()
+
+
+# A reverses the lift, every other button is left to main.py
+def on_button(button):
+    global STATE_CURRENT_FLOOR, STATE_START_FLOOR, STATE_TARGET_FLOOR, last_time
+    if button != CosmicUnicorn.SWITCH_A:
+        return False
+    # Reverse direction by swapping current and target floor
+    STATE_START_FLOOR, STATE_TARGET_FLOOR = STATE_TARGET_FLOOR, STATE_START_FLOOR
+    STATE_CURRENT_FLOOR = STATE_START_FLOOR
+    last_time = time.ticks_ms()
+    return True
+
+
+def queue_sound(wav_file):
+    global next_sound
+    next_sound = wav_file
+    sound_queued.set()
+
+
+# plays a sound on its mixer voice, returning False if it has to be streamed instead
+def mix(wav_file):
+    global mixing
+    if mixing:
+        try:
+            sound.play_voice(VOICES[wav_file], wav_file)
+            return True
+        except (ValueError, MemoryError) as e:
+            print("elevator: streaming the sounds, {} can't be mixed: {}".format(wav_file, e))
+            mixing = False
+    return False
+
 
-    if cu.is_pressed(CosmicUnicorn.SWITCH_BRIGHTNESS_UP):
-        cu.adjust_brightness(+0.01)
+# plays the queued sounds, out of draw() as a streamed sound is read from flash as it plays
+async def task():
+    global next_sound
+    while True:
+        await sound_queued.wait()
+        sound_queued.clear()
+        if next_sound is not None:
+            wav_file, next_sound = next_sound, None
+            if not mix(wav_file):
+                try:
+                    await sound.play_wav_async(wav_file)
+                except (ValueError, OSError) as e:
+                    print("elevator: can't play {}: {}".format(wav_file, e))
+
+
+def draw():
+    global STATE_CURRENT_FLOOR, STATE_DIRECTION, last_time, floor_str, floor_str_for
+    time_ms = time.ticks_ms()
 
-    if cu.is_pressed(CosmicUnicorn.SWITCH_BRIGHTNESS_DOWN):
-        cu.adjust_brightness(-0.01)
-    
     if STATE_CURRENT_FLOOR < STATE_TARGET_FLOOR:
         STATE_DIRECTION = 1
     elif STATE_CURRENT_FLOOR > STATE_TARGET_FLOOR:
@@ -104,28 +176,30 @@ while True:
     else:
         STATE_DIRECTION=0
 
-    if STATE_CURRENT_FLOOR != STATE_TARGET_FLOOR and time_ms - last_time > HOLD_TIME_S * 1000:
+    if STATE_CURRENT_FLOOR != STATE_TARGET_FLOOR and time_ms - last_time > HOLD_TIME_MS:
         if STATE_CURRENT_FLOOR < STATE_TARGET_FLOOR:
             STATE_CURRENT_FLOOR += 1
         else:
             STATE_CURRENT_FLOOR -= 1
         if STATE_CURRENT_FLOOR == STATE_TARGET_FLOOR:
-            sound.play_wav("doorbell.wav", False)
+            queue_sound("doorbell.wav")
         else:
-            sound.play_wav("buttonbeep.wav", False)
+            queue_sound("buttonbeep.wav")
         last_time = time_ms
 
-    graphics.set_pen(graphics.create_pen(int(BACKGROUND_COLOUR[0]), int(BACKGROUND_COLOUR[1]), int(BACKGROUND_COLOUR[2])))
+    graphics.set_pen(BACKGROUND_PEN)
     graphics.clear()
-    graphics.set_pen(graphics.create_pen(int(OUTLINE_COLOUR[0]), int(OUTLINE_COLOUR[1]), int(OUTLINE_COLOUR[2])))
+    graphics.set_pen(OUTLINE_PEN)
 
     graphics.line(0,0,31,0)
     graphics.line(31,0,31,32)
     graphics.line(31,31,0,31)
     graphics.line(0,31,0,0)
         
-    if time_ms - last_time > STEP_TIME * 1000: 
-        floor_str = f'{STATE_CURRENT_FLOOR}'
+    if time_ms - last_time > STEP_TIME_MS: 
+        if floor_str_for != STATE_CURRENT_FLOOR:
+            floor_str = f'{STATE_CURRENT_FLOOR}'
+            floor_str_for = STATE_CURRENT_FLOOR
         x_pos = 5
         if STATE_CURRENT_FLOOR < 0:
             x_pos -= 2
@@ -133,16 +207,77 @@ while True:
 
     if STATE_CURRENT_FLOOR < STATE_TARGET_FLOOR and STATE_CURRENT_FLOOR != STATE_START_FLOOR:
         # Up arrow
-        graphics.set_pen(graphics.create_pen(int(MESSAGE_COLOUR[0]), int(MESSAGE_COLOUR[1]), int(MESSAGE_COLOUR[2])))
+        graphics.set_pen(MESSAGE_PEN)
         graphics.triangle(22, 10, 16, 20, 28, 20)
     elif STATE_CURRENT_FLOOR > STATE_TARGET_FLOOR and STATE_CURRENT_FLOOR != STATE_START_FLOOR:
         # Down arrow
-        graphics.set_pen(graphics.create_pen(int(MESSAGE_COLOUR[0]), int(MESSAGE_COLOUR[1]), int(MESSAGE_COLOUR[2])))
+        graphics.set_pen(MESSAGE_PEN)
         graphics.triangle(22, 20, 16, 10, 28, 10)
     # draw_text(MESSAGE, x=PADDING - shift, y=2)
 
-    # update the display
-    cu.update(graphics)
 
-    # pause for a moment (important or the USB serial device will fail)
-    time.sleep(0.05)
\ No newline at end of file
+# accounts the heap and times the I2S callback while main.py's profiler overlay is on, the
+# callback pays for it on every buffer
+def profile(enabled):
+    global profiling
+    profiling = enabled
+    if sound is not None:
+        sound.set_heap_accounting(enabled)
+        sound.set_timing(enabled)
+
+
+def report():
+    if sound is not None and profiling:
+        callbacks, total, largest = sound.heap_stats()
+        print("  audio: {} callbacks, {} bytes allocated, at most {} in one".format(callbacks, total, largest))
+        callbacks, callback_mean, callback_max, reads, read_mean, read_max, underruns, _ = sound.timing_stats()
+        print("  audio: callback {}/{} us, read {}/{} us (mean/max), {} underruns".format(
+            callback_mean, callback_max, read_mean, read_max, underruns))
+
+
+async def teardown():
+    global sound, next_sound
+    next_sound = None
+    # release the I2S peripheral so the next effect (or the next visit) can claim it
+    if sound is not None:
+        await sound.deinit_async()
+        sound = None
+
+
+def main():
+    global cu, graphics, next_sound
+    # create cosmic object and graphics surface for drawing
+    cu = CosmicUnicorn()
+    graphics = PicoGraphics(DISPLAY)
+    cu.set_brightness(0.8)
+    buttons = Buttons(cu)
+    init()
+    while True:
+        buttons.poll()
+        while buttons.pending():
+            button, kind = buttons.next_event()
+            # if A is pressed reverse the lift, if B, C, or D are pressed then reset
+            if kind == PRESS and not on_button(button) and button in (CosmicUnicorn.SWITCH_B, CosmicUnicorn.SWITCH_C, CosmicUnicorn.SWITCH_D):
+                machine.reset()
+
+        if buttons.is_held(CosmicUnicorn.SWITCH_BRIGHTNESS_UP):
+            cu.adjust_brightness(+0.01)
+
+        if buttons.is_held(CosmicUnicorn.SWITCH_BRIGHTNESS_DOWN):
+            cu.adjust_brightness(-0.01)
+
+        draw()
+        if next_sound is not None:
+            if not mix(next_sound):
+                sound.play_wav(next_sound)
+            next_sound = None
+
+        # update the display
+        cu.update(graphics)
+
+        # pause for a moment (important or the USB serial device will fail)
+        time.sleep(0.05)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,79 +1,136 @@
 import random
+from array import array
 from cosmic import CosmicUnicorn
+from pens import cache_for
 
 graphics = None
 palette = None
 
+# frame rate main.py runs draw() at
+FPS = 60
+# draw() only touches its own buffers and graphics, main.py may run it on the second core
+PIPELINE = True
+
 # setup heat value buffer and fire parameters
 width = CosmicUnicorn.WIDTH + 2
 height = CosmicUnicorn.HEIGHT + 4
-heat = [[0.0 for y in range(height)] for x in range(width)]
 fire_spawns = 5
 damping_factor = 0.97
 
+# heat values are stored as fixed point integers where HEAT_ONE == 1.0
+HEAT_SHIFT = 12
+HEAT_ONE = 1 << HEAT_SHIFT
+
+# one flat row-major buffer of heat values, indexed by y * width + x
+heat = array("H", [0] * (width * height))
+# x positions of this frame's fire spawns, filled in before each step
+spawns = bytearray(fire_spawns)
+
+# the five tap average and the damping are folded into a single 16.16 multiplier
+damping_multiplier = int(damping_factor * 65536 / 5)
+
+# heat thresholds for each palette entry
+THRESHOLDS = (0.15, 0.25, 0.35, 0.45)
+
+# heat values are quantized down to LEVEL_SHIFT bits before the palette lookup
+LEVEL_SHIFT = 4
+levels = bytearray((HEAT_ONE >> LEVEL_SHIFT) + 1)
+for level in range(len(levels)):
+    value = (level << LEVEL_SHIFT) / HEAT_ONE
+    levels[level] = sum(1 for threshold in THRESHOLDS if value >= threshold)
+
+# palette index last written to each pixel, and the pixels that changed this frame
+shown = bytearray(CosmicUnicorn.WIDTH * CosmicUnicorn.HEIGHT)
+changed = array("H", [0] * (CosmicUnicorn.WIDTH * CosmicUnicorn.HEIGHT))
+
 
 def init():
     # a palette of five firey colours (white, yellow, orange, red, smoke)
     global palette
+    pens = cache_for(graphics)
     palette = [
-        graphics.create_pen(0, 0, 0),
-        graphics.create_pen(20, 20, 20),
-        graphics.create_pen(180, 30, 0),
-        graphics.create_pen(220, 160, 0),
-        graphics.create_pen(255, 255, 180)
+        pens.get(0, 0, 0, pinned=True),
+        pens.get(20, 20, 20, pinned=True),
+        pens.get(180, 30, 0, pinned=True),
+        pens.get(220, 160, 0, pinned=True),
+        pens.get(255, 255, 180, pinned=True)
     ]
+    invalidate()
 
 
-# returns the palette entry for a given heat value
-@micropython.native  # noqa: F821
-def pen_from_value(value):
-    if value < 0.15:
-        return palette[0]
-    elif value < 0.25:
-        return palette[1]
-    elif value < 0.35:
-        return palette[2]
-    elif value < 0.45:
-        return palette[3]
-    return palette[4]
+# forget what is on screen so the next frame redraws every pixel
+def invalidate():
+    for i in range(len(shown)):
+        shown[i] = 0xFF
 
 
-@micropython.native  # noqa: F821
-def draw():
+# spawn, diffuse and damp the heat buffer in a single pass
+@micropython.viper  # noqa: F821
+def step(buffer, spawn_xs, spawn_count: int, w: int, h: int, multiplier: int, one: int):
+    b = ptr16(buffer)  # noqa: F821
+    s = ptr8(spawn_xs)  # noqa: F821
+
     # clear the the rows off the bottom of the display
-    for x in range(width):
-        heat[x][height - 1] = 0.0
-        heat[x][height - 2] = 0.0
+    bottom = (h - 1) * w
+    above = (h - 2) * w
+    for x in range(w):
+        b[bottom + x] = 0
+        b[above + x] = 0
 
     # add new fire spawns
-    for c in range(fire_spawns):
-        x = random.randint(0, width - 4) + 2
-        heat[x + 0][height - 1] = 1.0
-        heat[x + 1][height - 1] = 1.0
-        heat[x - 1][height - 1] = 1.0
-        heat[x + 0][height - 2] = 1.0
-        heat[x + 1][height - 2] = 1.0
-        heat[x - 1][height - 2] = 1.0
+    for c in range(spawn_count):
+        x = s[c]
+        b[bottom + x - 1] = one
+        b[bottom + x] = one
+        b[bottom + x + 1] = one
+        b[above + x - 1] = one
+        b[above + x] = one
+        b[above + x + 1] = one
 
     # average and damp out each value to create rising flame effect
-    for y in range(0, height - 2):
-        for x in range(1, width - 1):
-            # update this pixel by averaging the below pixels
-            average = (
-                heat[x][y] + heat[x][y + 1] + heat[x][y + 2] + heat[x - 1][y + 1] + heat[x + 1][y + 1]
-            ) / 5.0
-
-            # damping factor to ensure flame tapers out towards the top of the displays
-            average *= damping_factor
-
-            # update the heat map with our newly averaged value
-            heat[x][y] = average
-
-    # render the heat values to the graphics buffer
-    for y in range(CosmicUnicorn.HEIGHT):
-        for x in range(CosmicUnicorn.WIDTH):
-            graphics.set_pen(pen_from_value(heat[x + 1][y]))
-            graphics.pixel(x, y)
+    for y in range(h - 2):
+        row = y * w
+        for x in range(1, w - 1):
+            i = row + x
+            total = b[i] + b[i + w] + b[i + w + w] + b[i + w - 1] + b[i + w + 1]
+            b[i] = (total * multiplier) >> 16
+
+
+# map the visible heat values to palette indices and collect the pixels whose index changed
+@micropython.viper  # noqa: F821
+def diff(buffer, lut, previous, out, w: int, columns: int, rows: int, shift: int) -> int:
+    b = ptr16(buffer)  # noqa: F821
+    t = ptr8(lut)  # noqa: F821
+    p = ptr8(previous)  # noqa: F821
+    o = ptr16(out)  # noqa: F821
+    count = 0
+    for y in range(rows):
+        row = y * w + 1
+        pixel = y * columns
+        for x in range(columns):
+            index = t[b[row + x] >> shift]
+            if p[pixel + x] != index:
+                p[pixel + x] = index
+                o[count] = pixel + x
+                count += 1
+    return count
+
+
+@micropython.native  # noqa: F821
+def draw():
+    # pick this frame's fire spawn positions
+    for c in range(fire_spawns):
+        spawns[c] = random.randint(0, width - 4) + 2
+
+    step(heat, spawns, fire_spawns, width, height, damping_multiplier, HEAT_ONE)
+
+    # only touch the pixels whose palette entry changed since the last frame
+    columns = CosmicUnicorn.WIDTH
+    count = diff(heat, levels, shown, changed, width, columns, CosmicUnicorn.HEIGHT, LEVEL_SHIFT)
+    for c in range(count):
+        pixel = changed[c]
+        graphics.set_pen(palette[shown[pixel]])
+        graphics.pixel(pixel % columns, pixel // columns)
 
 
 def test():
@@ -0,0 +1,20 @@
+"""
+Snapshots of a PicoGraphics framebuffer.
+
+PicoGraphics exposes its framebuffer through the buffer protocol, so a finished frame can
+be copied out once and copied back in later instead of being drawn again.
+"""
+
+
+# copies the current framebuffer into frame (allocating it if None) and returns it
+def snapshot(graphics, frame=None):
+    buffer = memoryview(graphics)
+    if frame is None:
+        return bytearray(buffer)
+    frame[:] = buffer
+    return frame
+
+
+# copies a frame taken with snapshot() back into the framebuffer
+def blit(graphics, frame):
+    memoryview(graphics)[:] = frame
@@ -0,0 +1,83 @@
+"""
+Stand-ins for the Cosmic Unicorn firmware modules, so the effects run on a Linux box.
+
+install() puts the host versions of cosmic, picographics, machine, network, ntptime,
+micropython, time and gc into sys.modules, the viper pointer casts into builtins and
+asyncio.sleep_ms() into asyncio, before anything imports the real ones. Time is virtual
+(see clock.py): it only moves when something sleeps, so an effect runs as fast as the CPU
+allows and the same inputs always give the same frames. asyncio.run() uses a loop that
+jumps the virtual clock to its next timer instead of waiting for it.
+
+    import host
+    host.install()
+    fire = host.load_effect("fire")
+    for _ in range(100):
+        fire.draw()
+        fire.cu.update(fire.graphics)
+
+python -m host [--out DIR] <effect> [frames] does the same and writes the last frame to
+<effect>.ppm in DIR, the temporary directory by default.
+"""
+
+import sys
+import asyncio
+import builtins
+
+from host import clock as _clock_module
+from host import mpgc, mptime, machine, micropython, network, ntptime
+from host.clock import VirtualClock, VirtualTimePolicy
+
+clock = None
+
+
+# installs the stand-ins and returns the VirtualClock they share
+def install(start_us=0):
+    global clock
+    if clock is not None:
+        return clock
+    clock = VirtualClock(start_us)
+    mptime.bind(clock)
+    machine.bind(clock)
+
+    from host import cosmic, picographics
+    sys.modules.update({
+        "cosmic": cosmic,
+        "picographics": picographics,
+        "machine": machine,
+        "network": network,
+        "ntptime": ntptime,
+        "micropython": micropython,
+        "time": mptime,
+        "utime": mptime,
+        "gc": mpgc,
+    })
+    # viper code uses these without importing them, as does @micropython.native
+    builtins.micropython = micropython
+    builtins.ptr8 = micropython.ptr8
+    builtins.ptr16 = micropython.ptr16
+    builtins.ptr32 = micropython.ptr32
+
+    asyncio.sleep_ms = _clock_module.sleep_ms
+    asyncio.set_event_loop_policy(VirtualTimePolicy(clock))
+    return clock
+
+
+# imports an effect module and sets it up the way main.py does, returning the module
+def load_effect(name, cu=None, graphics=None):
+    install()
+    from cosmic import CosmicUnicorn
+    from picographics import PicoGraphics, DISPLAY_COSMIC_UNICORN
+    effect = __import__(name)
+    effect.cu = cu if cu is not None else CosmicUnicorn()
+    effect.graphics = graphics if graphics is not None else PicoGraphics(DISPLAY_COSMIC_UNICORN)
+    effect.init()
+    return effect
+
+
+# writes a surface (or a CosmicUnicorn frame) to a binary PPM file
+def write_ppm(path, frame, width=32, height=32):
+    pixels = memoryview(frame).cast("B")
+    with open(path, "wb") as f:
+        f.write(b"P6 %d %d 255\n" % (width, height))
+        for i in range(0, width * height * 4, 4):
+            f.write(bytes((pixels[i + 2], pixels[i + 1], pixels[i])))
@@ -0,0 +1,46 @@
+import os
+import sys
+import time
+import asyncio
+import tempfile
+
+import host
+
+USAGE = "usage: python -m host [--out DIR] <effect> [frames]"
+
+
+def main(argv):
+    # the frame goes to the temporary directory unless --out says where, never into the tree
+    out = tempfile.gettempdir()
+    if argv[:1] == ["--out"] and len(argv) > 1:
+        out, argv = argv[1], argv[2:]
+    if not argv:
+        print(USAGE)
+        return 2
+    name = argv[0]
+    frames = int(argv[1]) if len(argv) > 1 else 100
+
+    clock = host.install()
+    effect = host.load_effect(name)
+    period_us = 1_000_000 // getattr(effect, "FPS", 30)
+    started = time.perf_counter()
+    for _ in range(frames):
+        effect.draw()
+        effect.cu.update(effect.graphics)
+        clock.advance_us(period_us)
+    elapsed = time.perf_counter() - started
+    if hasattr(effect, "teardown"):
+        pending = effect.teardown()
+        if pending is not None:
+            asyncio.run(pending)
+
+    os.makedirs(out, exist_ok=True)
+    path = os.path.join(out, name + ".ppm")
+    host.write_ppm(path, effect.cu.frame)
+    print("{}: {} frames in {:.3f} s ({:.0f} fps), last frame in {}".format(
+        name, frames, elapsed, frames / elapsed if elapsed else 0, path))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
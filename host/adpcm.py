@@ -0,0 +1,137 @@
+"""
+Converts 8 or 16-bit PCM WAV files to IMA-ADPCM WAV files, which WavPlayer decodes as it plays.
+
+IMA-ADPCM stores each sample in 4 bits, a quarter of the size of 16-bit PCM, so a clip takes
+a quarter of the flash and is read from it at a quarter of the rate. The samples are written
+in blocks of BLOCK_ALIGN bytes per channel, each starting with the exact sample and step index
+the decoder restarts from, as Windows and most tools expect.
+
+    python -m host.adpcm doorbell.wav doorbell_ima.wav
+
+The quality loss is audible on music but not on the short UI sounds the effects play.
+"""
+
+import sys
+import wave
+import struct
+
+import host
+
+host.install()                          # audio.py needs machine and the viper stand-ins
+from audio import IMA_STEPS             # noqa: E402
+
+WAVE_FORMAT_IMA_ADPCM = 0x11
+
+# bytes per block for each channel, the usual size for 44.1kHz audio
+BLOCK_ALIGN = 1024
+
+
+# returns the 4 bit code for sample and the predictor and step index the decoder will have after it
+def encode_sample(sample, predictor, index):
+    step = IMA_STEPS[index]
+    diff = sample - predictor
+    code = 0
+    if diff < 0:
+        code = 8
+        diff = -diff
+    if diff >= step:
+        code |= 4
+        diff -= step
+    if diff >= step >> 1:
+        code |= 2
+        diff -= step >> 1
+    if diff >= step >> 2:
+        code |= 1
+    return (code,) + decode_sample(code, predictor, index)
+
+
+# returns the predictor and step index after decoding code, the same way as audio._decode_ima()
+def decode_sample(code, predictor, index):
+    step = IMA_STEPS[index]
+    diff = step >> 3
+    if code & 1:
+        diff += step >> 2
+    if code & 2:
+        diff += step >> 1
+    if code & 4:
+        diff += step
+        index += ((code & 3) + 1) << 1
+    else:
+        index -= 1
+    predictor = predictor - diff if code & 8 else predictor + diff
+    return max(-32768, min(32767, predictor)), max(0, min(88, index))
+
+
+def frames_per_block(channels, block_align=BLOCK_ALIGN):
+    return (block_align * channels - 4 * channels) * 2 // channels + 1
+
+
+# encodes interleaved 16-bit samples into blocks of block_align bytes per channel, the last one short
+def encode(samples, channels, block_align=BLOCK_ALIGN):
+    frames = len(samples) // channels
+    per_block = frames_per_block(channels, block_align)
+    indexes = [0] * channels
+    out = bytearray()
+    for first in range(0, frames, per_block):
+        count = min(per_block, frames - first)
+        predictors = []
+        for ch in range(channels):
+            predictors.append(samples[first * channels + ch])
+            out += struct.pack("<hBB", predictors[ch], indexes[ch], 0)
+
+        # the rest go in groups of 8 per channel, the last group padded with the last sample
+        for group in range(1, count, 8):
+            for ch in range(channels):
+                codes = []
+                for frame in range(first + group, first + group + 8):
+                    frame = min(frame, first + count - 1)
+                    code, predictors[ch], indexes[ch] = encode_sample(samples[frame * channels + ch], predictors[ch], indexes[ch])
+                    codes.append(code)
+                out += bytes(codes[i] | (codes[i + 1] << 4) for i in range(0, 8, 2))
+    return out
+
+
+# reads a PCM WAV file, returning (interleaved 16-bit samples, channels, sample rate)
+def read_pcm(path):
+    with wave.open(path, "rb") as f:
+        channels, width, rate, frames = f.getnchannels(), f.getsampwidth(), f.getframerate(), f.getnframes()
+        data = f.readframes(frames)
+    if width == 2:
+        samples = list(struct.unpack("<%dh" % (len(data) // 2), data))
+    elif width == 1:
+        samples = [(byte - 128) << 8 for byte in data]
+    else:
+        raise ValueError("only 8 and 16-bit WAV files can be converted")
+    if channels > 2:
+        raise ValueError("only mono and stereo WAV files can be converted")
+    return samples, channels, rate
+
+
+def write_adpcm(path, samples, channels, rate, block_align=BLOCK_ALIGN):
+    data = encode(samples, channels, block_align)
+    block_align *= channels
+    per_block = frames_per_block(channels, block_align // channels)
+    fmt = struct.pack("<HHIIHHHH", WAVE_FORMAT_IMA_ADPCM, channels, rate, rate * block_align // per_block,
+                      block_align, 4, 2, per_block)
+    fact = struct.pack("<I", len(samples) // channels)
+    body = (b"WAVE" + b"fmt " + struct.pack("<I", len(fmt)) + fmt
+            + b"fact" + struct.pack("<I", len(fact)) + fact
+            + b"data" + struct.pack("<I", len(data)) + data + b"\0" * (len(data) & 1))
+    with open(path, "wb") as f:
+        f.write(b"RIFF" + struct.pack("<I", len(body)) + body)
+    return len(data)
+
+
+def main(argv):
+    if len(argv) != 2:
+        print("usage: python -m host.adpcm <input.wav> <output.wav>")
+        return 2
+    samples, channels, rate = read_pcm(argv[0])
+    size = write_adpcm(argv[1], samples, channels, rate)
+    print("{}: {} samples, {} bytes of PCM to {} bytes of IMA-ADPCM".format(
+        argv[1], len(samples), len(samples) * 2, size))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
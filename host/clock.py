@@ -0,0 +1,98 @@
+"""
+Virtual time for the host backend.
+
+VirtualClock only moves when something sleeps (time.sleep*, asyncio sleeps under
+VirtualTimeLoop) or calls advance_us(), so an effect runs as fast as the CPU allows and
+the same inputs always give the same frames. The ticks_* functions wrap like MicroPython's,
+at TICKS_PERIOD, so code that compares ticks without ticks_diff() breaks here as well.
+"""
+
+import math
+import time as _time
+import asyncio
+import selectors
+
+TICKS_PERIOD = 1 << 30
+
+
+class VirtualClock:
+    def __init__(self, start_us=0):
+        self.__us = start_us
+        self.__listeners = []
+
+    # microseconds since the clock was created (plus start_us), never wraps
+    def now_us(self):
+        return self.__us
+
+    def advance_us(self, us):
+        if us > 0:
+            self.__us += us
+            for listener in self.__listeners:
+                listener(self.__us)
+
+    # listener(now_us) is called every time the clock moves, used to pace the I2S stand-in
+    def add_listener(self, listener):
+        self.__listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self.__listeners:
+            self.__listeners.remove(listener)
+
+    def ticks_ms(self):
+        return (self.__us // 1000) & (TICKS_PERIOD - 1)
+
+    def ticks_us(self):
+        return self.__us & (TICKS_PERIOD - 1)
+
+    def sleep_us(self, us):
+        self.advance_us(int(us))
+        # let other threads (the pipeline's second core) run, as a real sleep would
+        _time.sleep(0)
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & (TICKS_PERIOD - 1)
+
+
+def ticks_diff(end, start):
+    half = TICKS_PERIOD // 2
+    return ((end - start + half) & (TICKS_PERIOD - 1)) - half
+
+
+# Passes everything to a real selector, but turns a wait for the next timer into a jump of
+# the virtual clock to it
+class _VirtualSelector:
+    def __init__(self, selector, clock):
+        self.__selector = selector
+        self.__clock = clock
+
+    def select(self, timeout=None):
+        if timeout is not None and timeout > 0:
+            self.__clock.advance_us(math.ceil(timeout * 1_000_000))
+            timeout = 0
+        return self.__selector.select(timeout)
+
+    def __getattr__(self, name):
+        return getattr(self.__selector, name)
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    def __init__(self, clock):
+        self.__clock = clock
+        super().__init__(_VirtualSelector(selectors.DefaultSelector(), clock))
+
+    def time(self):
+        return self.__clock.now_us() / 1_000_000
+
+
+class VirtualTimePolicy(asyncio.DefaultEventLoopPolicy):
+    def __init__(self, clock):
+        super().__init__()
+        self.__clock = clock
+
+    def new_event_loop(self):
+        return VirtualTimeLoop(self.__clock)
+
+
+async def sleep_ms(ms):
+    await asyncio.sleep(ms / 1000)
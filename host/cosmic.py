@@ -0,0 +1,71 @@
+"""
+CosmicUnicorn for the host.
+
+update() copies the surface into frame (the "panel") and counts it. Buttons are pressed and
+released by the caller with press() and release(), and is_pressed() reports them the way
+the board does.
+"""
+
+
+class CosmicUnicorn:
+    WIDTH = 32
+    HEIGHT = 32
+
+    SWITCH_A = 0
+    SWITCH_B = 1
+    SWITCH_C = 3
+    SWITCH_D = 6
+    SWITCH_SLEEP = 27
+    SWITCH_VOLUME_UP = 7
+    SWITCH_VOLUME_DOWN = 8
+    SWITCH_BRIGHTNESS_UP = 21
+    SWITCH_BRIGHTNESS_DOWN = 26
+
+    def __init__(self):
+        self.__brightness = 0.5
+        self.__volume = 0.5
+        self.__pressed = set()
+        self.frame = bytearray(self.WIDTH * self.HEIGHT * 4)
+        self.updates = 0
+
+    def clear(self):
+        self.frame[:] = bytes(len(self.frame))
+
+    def update(self, graphics):
+        self.frame[:] = memoryview(graphics)
+        self.updates += 1
+
+    def set_brightness(self, value):
+        self.__brightness = max(0.0, min(1.0, value))
+
+    def get_brightness(self):
+        return self.__brightness
+
+    def adjust_brightness(self, delta):
+        self.set_brightness(self.__brightness + delta)
+
+    def set_volume(self, value):
+        self.__volume = max(0.0, min(1.0, value))
+
+    def get_volume(self):
+        return self.__volume
+
+    def adjust_volume(self, delta):
+        self.set_volume(self.__volume + delta)
+
+    def light(self):
+        return 2048
+
+    def is_pressed(self, switch):
+        return switch in self.__pressed
+
+    # host only: hold a switch down until release()
+    def press(self, switch):
+        self.__pressed.add(switch)
+
+    def release(self, switch):
+        self.__pressed.discard(switch)
+
+    def release_all(self):
+        self.__pressed.clear()
+
@@ -0,0 +1,126 @@
+"""
+The parts of machine the effects and the audio player use: Pin, RTC, I2S and reset().
+
+I2S consumes what is written to it in virtual time, at the rate it was opened with, and
+calls its irq handler once a write has played out, so WavPlayer's callback runs as it does
+on the device whenever the clock moves. The RTC runs on the virtual clock too, starting from
+the host's local time when it is first created (ntptime.settime() resets it to UTC).
+"""
+
+import time as _time
+import calendar
+
+_clock = None
+
+audio_bytes = 0         # bytes written to every I2S instance so far
+
+
+def bind(clock):
+    global _clock
+    _clock = clock
+
+
+def reset():
+    raise SystemExit("machine.reset()")
+
+
+def soft_reset():
+    reset()
+
+
+def freq(hz=None):
+    return 125_000_000
+
+
+def unique_id():
+    return b"\x00host\x00\x00\x00"
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    PULL_UP = 1
+    PULL_DOWN = 2
+
+    def __init__(self, id, mode=IN, pull=None, value=None):
+        self.id = id
+        self.mode = mode
+        self.__value = 0 if value is None else value
+
+    def value(self, value=None):
+        if value is None:
+            return self.__value
+        self.__value = 1 if value else 0
+
+    def on(self):
+        self.__value = 1
+
+    def off(self):
+        self.__value = 0
+
+    def toggle(self):
+        self.__value ^= 1
+
+    def __call__(self, value=None):
+        return self.value(value)
+
+
+_rtc_base = None        # (epoch seconds, virtual us) the RTC was last set at
+
+
+class RTC:
+    def __init__(self):
+        global _rtc_base
+        if _rtc_base is None:
+            _rtc_base = (calendar.timegm(_time.localtime()), _clock.now_us())
+
+    # (year, month, day, weekday, hours, minutes, seconds, subseconds) like the device
+    def datetime(self, value=None):
+        global _rtc_base
+        if value is not None:
+            year, month, day, _, hours, minutes, seconds, _ = value
+            _rtc_base = (calendar.timegm((year, month, day, hours, minutes, seconds, 0, 0, 0)), _clock.now_us())
+            return
+        seconds, set_at = _rtc_base
+        now = _time.gmtime(seconds + (_clock.now_us() - set_at) // 1_000_000)
+        return (now.tm_year, now.tm_mon, now.tm_mday, now.tm_wday, now.tm_hour, now.tm_min, now.tm_sec, 0)
+
+
+class I2S:
+    TX = 0
+    RX = 1
+    MONO = 0
+    STEREO = 1
+
+    def __init__(self, id, sck=None, ws=None, sd=None, mode=TX, bits=16, format=MONO, rate=44_100, ibuf=20000):
+        channels = 2 if format == I2S.STEREO else 1
+        self.bytes_per_second = rate * channels * bits // 8
+        self.__handler = None
+        self.__busy_until = None        # virtual us the last write finishes playing
+        self.bytes_written = 0
+        _clock.add_listener(self.__tick)
+
+    def irq(self, handler):
+        self.__handler = handler
+
+    def write(self, buffer):
+        global audio_bytes
+        length = len(buffer)
+        start = _clock.now_us() if self.__busy_until is None else self.__busy_until
+        self.__busy_until = start + length * 1_000_000 // self.bytes_per_second
+        self.bytes_written += length
+        audio_bytes += length
+        return length
+
+    def deinit(self):
+        _clock.remove_listener(self.__tick)
+        self.__handler = None
+        self.__busy_until = None
+
+    def __tick(self, now):
+        # a handler that writes again pushes __busy_until on, so play out everything now due
+        while self.__busy_until is not None and now >= self.__busy_until:
+            self.__busy_until = None
+            if self.__handler is None:
+                return
+            self.__handler(self)
@@ -0,0 +1,47 @@
+"""
+The micropython module for the host: the code emitters leave functions as plain Python.
+"""
+
+
+def native(function):
+    return function
+
+
+def viper(function):
+    return function
+
+
+def const(value):
+    return value
+
+
+def schedule(function, argument):
+    function(argument)
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+def mem_info(verbose=None):
+    pass
+
+
+# viper pointer casts, put into builtins by install() since viper code uses them unimported
+def ptr8(buffer):
+    return memoryview(buffer).cast("B")
+
+
+# on the device a pointer doesn't care how long the buffer is, so a trailing odd byte is dropped here
+def ptr16(buffer):
+    data = memoryview(buffer).cast("B")
+    if len(data) & 1:
+        data = data[:len(data) & ~1]
+    return data.cast("H")
+
+
+def ptr32(buffer):
+    data = memoryview(buffer).cast("B")
+    if len(data) & 3:
+        data = data[:len(data) & ~3]
+    return data.cast("I")
@@ -0,0 +1,35 @@
+"""
+The gc module as the effects see it on the host.
+
+mem_alloc() reports what tracemalloc has traced (0 unless it is tracing) and mem_free() the
+rest of a heap the size of the Pico W's, so the heap accounting in main.py and the audio
+player keeps working. Everything else is the real gc module.
+"""
+
+import gc as _gc
+import tracemalloc
+
+HEAP_BYTES = 192 * 1024
+
+_threshold = -1
+
+
+def mem_alloc():
+    if not tracemalloc.is_tracing():
+        return 0
+    return tracemalloc.get_traced_memory()[0]
+
+
+def mem_free():
+    return max(0, HEAP_BYTES - mem_alloc())
+
+
+def threshold(amount=None):
+    global _threshold
+    if amount is None:
+        return _threshold
+    _threshold = amount
+
+
+def __getattr__(name):
+    return getattr(_gc, name)
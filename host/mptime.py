@@ -0,0 +1,44 @@
+"""
+The time module as the effects see it on the host.
+
+Sleeps and ticks come from the VirtualClock that install() hands to bind(), everything
+else (time(), localtime(), monotonic() for the standard library) is the real time module.
+"""
+
+import time as _time
+from host.clock import ticks_add, ticks_diff  # noqa: F401
+
+_clock = None
+
+
+def bind(clock):
+    global _clock
+    _clock = clock
+
+
+def ticks_ms():
+    return _clock.ticks_ms()
+
+
+def ticks_us():
+    return _clock.ticks_us()
+
+
+def ticks_cpu():
+    return _clock.ticks_us()
+
+
+def sleep(seconds):
+    _clock.sleep_us(seconds * 1_000_000)
+
+
+def sleep_ms(ms):
+    _clock.sleep_us(ms * 1000)
+
+
+def sleep_us(us):
+    _clock.sleep_us(us)
+
+
+def __getattr__(name):
+    return getattr(_time, name)
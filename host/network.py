@@ -0,0 +1,47 @@
+"""
+A WLAN that connects CONNECT_MS of virtual time after connect(), to any network.
+"""
+
+from host import mptime
+
+STA_IF = 0
+AP_IF = 1
+
+STAT_IDLE = 0
+STAT_CONNECTING = 1
+STAT_GOT_IP = 3
+
+CONNECT_MS = 1500
+
+
+class WLAN:
+    def __init__(self, interface=STA_IF):
+        self.__interface = interface
+        self.__active = False
+        self.__connect_at = None
+
+    def active(self, value=None):
+        if value is None:
+            return self.__active
+        self.__active = bool(value)
+
+    def connect(self, ssid=None, key=None):
+        if not self.__active:
+            raise OSError("WLAN not active")
+        self.__connect_at = mptime.ticks_add(mptime.ticks_ms(), CONNECT_MS)
+
+    def disconnect(self):
+        self.__connect_at = None
+
+    def status(self):
+        if self.__connect_at is None:
+            return STAT_IDLE
+        if mptime.ticks_diff(mptime.ticks_ms(), self.__connect_at) < 0:
+            return STAT_CONNECTING
+        return STAT_GOT_IP
+
+    def isconnected(self):
+        return self.status() == STAT_GOT_IP
+
+    def ifconfig(self):
+        return ("192.168.4.2", "255.255.255.0", "192.168.4.1", "192.168.4.1")
@@ -0,0 +1,18 @@
+"""
+ntptime for the host: settime() sets the RTC to the host's UTC time, without the network.
+"""
+
+import time as _time
+from host import machine
+
+host = "pool.ntp.org"
+timeout = 1
+
+
+def time():
+    return int(_time.time())
+
+
+def settime():
+    now = _time.gmtime()
+    machine.RTC().datetime((now.tm_year, now.tm_mon, now.tm_mday, now.tm_wday, now.tm_hour, now.tm_min, now.tm_sec, 0))
@@ -0,0 +1,186 @@
+"""
+PicoGraphics for the host, drawing into an RGB888 framebuffer in memory.
+
+The surface is a bytearray of one native-endian 0x00RRGGBB word per pixel, the layout the
+device uses for the Cosmic Unicorn, so memoryview(graphics) and frames.py work unchanged
+and numpy.frombuffer(graphics, numpy.uint32) reads it without a copy. as_array() returns
+that as a (height, width, 3) RGB view when NumPy is installed.
+
+Text is drawn as one solid box per character on a fixed cell per font, close enough for
+layout and timings but not for reading.
+"""
+
+import math
+from array import array
+
+DISPLAY_COSMIC_UNICORN = 0x2C
+
+PEN_RGB888 = 7
+
+DISPLAYS = {
+    DISPLAY_COSMIC_UNICORN: (32, 32),
+}
+
+# font -> (character advance, line height) at scale 1
+FONTS = {
+    "bitmap4": (4, 5),
+    "bitmap6": (6, 6),
+    "bitmap8": (6, 8),
+    "bitmap14_outline": (9, 14),
+    "sans": (10, 16),
+    "serif": (10, 16),
+}
+DEFAULT_FONT = "bitmap8"
+
+
+class PicoGraphics(bytearray):
+    def __init__(self, display=DISPLAY_COSMIC_UNICORN, pen_type=PEN_RGB888, rotate=0):
+        if display not in DISPLAYS:
+            raise ValueError("unsupported display")
+        if pen_type != PEN_RGB888:
+            raise ValueError("only PEN_RGB888 is supported on the host")
+        self.width, self.height = DISPLAYS[display]
+        super().__init__(self.width * self.height * 4)
+        self.__pixels = memoryview(self).cast("I")
+        self.__pen = 0
+        self.__font = FONTS[DEFAULT_FONT]
+        self.__clip = (0, 0, self.width, self.height)
+
+    def get_bounds(self):
+        return self.width, self.height
+
+    # returns the framebuffer as a (height, width, 3) RGB uint8 NumPy view
+    def as_array(self):
+        import numpy
+        return numpy.frombuffer(self, numpy.uint8).reshape(self.height, self.width, 4)[:, :, 2::-1]
+
+    def create_pen(self, r, g, b):
+        return ((r & 0xFF) << 16) | ((g & 0xFF) << 8) | (b & 0xFF)
+
+    def create_pen_hsv(self, h, s, v):
+        i = int(h * 6.0)
+        f = h * 6.0 - i
+        p, q, t = v * (1.0 - s), v * (1.0 - f * s), v * (1.0 - (1.0 - f) * s)
+        r, g, b = ((v, t, p), (q, v, p), (p, v, t), (p, q, v), (t, p, v), (v, p, q))[i % 6]
+        return PicoGraphics.create_pen(self, int(r * 255), int(g * 255), int(b * 255))
+
+    def set_pen(self, pen):
+        self.__pen = pen
+
+    def set_font(self, font):
+        self.__font = FONTS.get(font, FONTS[DEFAULT_FONT])
+
+    def set_clip(self, x, y, w, h):
+        self.__clip = (max(0, x), max(0, y), min(self.width, x + w), min(self.height, y + h))
+
+    def remove_clip(self):
+        self.__clip = (0, 0, self.width, self.height)
+
+    # returns the pen at (x, y), for checking what an effect drew
+    def get_pixel(self, x, y):
+        return self.__pixels[y * self.width + x]
+
+    # the drawing methods only use the private helpers, so each call the effect makes is one
+    # call here and a subclass can count them (see bench)
+    def clear(self):
+        self.__rectangle(0, 0, self.width, self.height)
+
+    def pixel(self, x, y):
+        self.__pixel(x, y)
+
+    def pixel_span(self, x, y, length):
+        self.__span(x, x + length, y)
+
+    def rectangle(self, x, y, w, h):
+        self.__rectangle(x, y, w, h)
+
+    def line(self, x1, y1, x2, y2, thickness=1):
+        # Bresenham, both ends included
+        dx = abs(x2 - x1)
+        dy = -abs(y2 - y1)
+        sx = 1 if x1 < x2 else -1
+        sy = 1 if y1 < y2 else -1
+        error = dx + dy
+        while True:
+            self.__pixel(x1, y1)
+            if x1 == x2 and y1 == y2:
+                return
+            e2 = 2 * error
+            if e2 >= dy:
+                error += dy
+                x1 += sx
+            if e2 <= dx:
+                error += dx
+                y1 += sy
+
+    def circle(self, x, y, r):
+        for dy in range(-r, r + 1):
+            dx = int(math.sqrt(r * r - dy * dy) + 0.5)
+            self.__span(x - dx, x + dx + 1, y + dy)
+
+    def triangle(self, x1, y1, x2, y2, x3, y3):
+        area = (x2 - x1) * (y3 - y1) - (y2 - y1) * (x3 - x1)
+        if area == 0:
+            return
+        sign = 1 if area > 0 else -1
+        for y in range(min(y1, y2, y3), max(y1, y2, y3) + 1):
+            for x in range(min(x1, x2, x3), max(x1, x2, x3) + 1):
+                w1 = ((x2 - x1) * (y - y1) - (y2 - y1) * (x - x1)) * sign
+                w2 = ((x3 - x2) * (y - y2) - (y3 - y2) * (x - x2)) * sign
+                w3 = ((x1 - x3) * (y - y3) - (y1 - y3) * (x - x3)) * sign
+                if w1 >= 0 and w2 >= 0 and w3 >= 0:
+                    self.__pixel(x, y)
+
+    def measure_text(self, text, scale=2, spacing=1, fixed_width=False):
+        return self.__measure(text, scale, spacing)
+
+    def text(self, text, x, y, wordwrap=None, scale=2, angle=0, spacing=1, fixed_width=False):
+        scale = max(1, int(scale))
+        advance, line_height = self.__font
+        lines = self.__wrap(str(text), wordwrap, scale, spacing)
+        for row, line in enumerate(lines):
+            top = y + row * line_height * scale
+            left = x
+            for char in line:
+                if char != " ":
+                    self.__rectangle(left, top, (advance - 1) * scale, (line_height - 1) * scale)
+                left += advance * scale + spacing - 1
+
+    def __wrap(self, text, wordwrap, scale, spacing):
+        if wordwrap is None or wordwrap <= 0:
+            return text.split("\n")
+        lines = []
+        for paragraph in text.split("\n"):
+            line = ""
+            for word in paragraph.split(" "):
+                candidate = word if not line else line + " " + word
+                if line and self.__measure(candidate, scale, spacing) > wordwrap:
+                    lines.append(line)
+                    line = word
+                else:
+                    line = candidate
+            lines.append(line)
+        return lines
+
+    def __measure(self, text, scale, spacing):
+        return len(text) * self.__font[0] * int(scale) + max(0, len(text) - 1) * (spacing - 1)
+
+    def __pixel(self, x, y):
+        x1, y1, x2, y2 = self.__clip
+        if x1 <= x < x2 and y1 <= y < y2:
+            self.__pixels[y * self.width + x] = self.__pen
+
+    def __rectangle(self, x, y, w, h):
+        for row in range(y, y + h):
+            self.__span(x, x + w, row)
+
+    def __span(self, x1, x2, y):
+        cx1, cy1, cx2, cy2 = self.__clip
+        if not cy1 <= y < cy2:
+            return
+        x1 = max(x1, cx1)
+        x2 = min(x2, cx2)
+        if x1 >= x2:
+            return
+        offset = y * self.width
+        self.__pixels[offset + x1:offset + x2] = array("I", [self.__pen]) * (x2 - x1)
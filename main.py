@@ -1,7 +1,14 @@
+import gc
 import time
-import machine
+import asyncio
 from cosmic import CosmicUnicorn
 from picographics import PicoGraphics, DISPLAY_COSMIC_UNICORN as DISPLAY
+from pens import cache_for
+from buttons import Buttons, PRESS
+from frames import snapshot, blit
+from profiler import Profiler, DRAW, UPDATE, INPUT
+from registry import Registry
+from pipeline import Pipeline
 
 # --- Menu Display Constants ---
 MENU_TOP_START_Y = 0         # y position for first option
@@ -14,9 +21,44 @@ MENU_CIRCLE_CENTER_OFFSET_Y = 2 + MENU_CIRCLE_RADIUS  # offset to center circle
 # create cosmic object and graphics surface for drawing
 cosmic = CosmicUnicorn()
 graphics = PicoGraphics(DISPLAY)
+buttons = Buttons(cosmic)
+profiler = Profiler()
+pens = cache_for(graphics)
+
+BLACK = pens.get(0, 0, 0, pinned=True)
+ERROR_RED = pens.get(255, 0, 0, pinned=True)
+# Profiler overlay colors (background, draw, update, input)
+OVERLAY_COLORS = [
+    pens.get(0, 0, 0, pinned=True),
+    pens.get(255, 0, 0, pinned=True),
+    pens.get(0, 255, 0, pinned=True),
+    pens.get(0, 128, 255, pinned=True),
+]
+# Four distinct menu colors (red, green, blue, yellow)
+MENU_COLORS = [
+    pens.get(255, 0, 0, pinned=True),    # Red
+    pens.get(0, 255, 0, pinned=True),    # Green
+    pens.get(0, 128, 255, pinned=True),  # Blue
+    pens.get(255, 200, 0, pinned=True),  # Yellow
+]
 
 brightness = 0.5
 
+# --- Frame Scheduling Constants ---
+DEFAULT_FPS = 30             # frame rate for effects that don't declare FPS
+MENU_FPS = 50                # frame rate of the menu (button polling)
+BRIGHTNESS_RATE = 1.0        # brightness change per second while LUX +/- (or sleep) is held
+INPUT_POLL_MS = 20           # button sampling interval of the input task
+PIPELINED = True             # draw effects that set PIPELINE = True on the second core
+
+# --- Garbage Collection Policy ---
+# Collections are run between frames, when the frame finished with at least GC_MIN_SLACK_MS
+# to spare and GC_COLLECT_BYTES have been allocated since the last one. The automatic
+# threshold is only a backstop, so a collection rarely lands in the middle of a frame.
+GC_MIN_SLACK_MS = 4
+GC_COLLECT_BYTES = 8 * 1024
+GC_THRESHOLD = 48 * 1024
+
 # Menu structure: [ (menu_name, [(option_name, effect_module_name or None)]) ]
 MENU = [
     ("SEQ", [
@@ -45,6 +87,11 @@ MENU = [
     ]),
 ]
 
+registry = Registry(MENU)
+
+# pipelined effects draw into a second surface on core 1, see pipeline.py
+pipeline = Pipeline(graphics, PicoGraphics(DISPLAY)) if PIPELINED else None
+
 BUTTONS = [
     CosmicUnicorn.SWITCH_A,
     CosmicUnicorn.SWITCH_B,
@@ -52,109 +99,308 @@ BUTTONS = [
     CosmicUnicorn.SWITCH_D,
 ]
 
-# returns the index of the button that is currently pressed or None if none are
-# 0: A, 1: B, 2: C, 3: D
+# Runs a loop at a fixed frame rate: await wait() sleeps until the next frame's deadline and
+# keeps count of frames that finished after it. The other tasks run while it sleeps, and
+# wait() returns early once sample_input() has queued button events to handle.
+class FrameClock:
+    def __init__(self, fps):
+        self.period_ms = max(1, 1000 // fps)
+        self.deadline = time.ticks_add(time.ticks_ms(), self.period_ms)
+        self.frames = 0
+        self.overruns = 0
+        self.worst_overrun_ms = 0
+
+    async def wait(self):
+        self.frames += 1
+        late = time.ticks_diff(time.ticks_ms(), self.deadline)
+        if late > 0:
+            # overran this frame, don't try to catch up on the frames we missed
+            self.overruns += 1
+            self.worst_overrun_ms = max(self.worst_overrun_ms, late)
+            self.deadline = time.ticks_add(self.deadline, self.period_ms * (late // self.period_ms + 1))
+            # still give the other tasks a turn
+            await asyncio.sleep_ms(0)
+            return
+        if late < -GC_MIN_SLACK_MS and gc.mem_alloc() - heap_after_collect >= GC_COLLECT_BYTES:
+            collect_garbage()
+            late = time.ticks_diff(time.ticks_ms(), self.deadline)
+        while late < 0:
+            if buttons.pending():
+                return
+            await asyncio.sleep_ms(min(-late, INPUT_POLL_MS))
+            late = time.ticks_diff(time.ticks_ms(), self.deadline)
+        self.deadline = time.ticks_add(self.deadline, self.period_ms)
+
+    def report(self, name):
+        print("{}: {} frames at {} ms, {} overruns, worst {} ms".format(
+            name, self.frames, self.period_ms, self.overruns, self.worst_overrun_ms))
+
+# collects now and remembers how much was still allocated afterwards
+def collect_garbage():
+    global heap_after_collect
+    gc.collect()
+    heap_after_collect = gc.mem_alloc()
 
-def pressed_index():
-    for i, btn in enumerate(BUTTONS):
-        if cosmic.is_pressed(btn):
-            return i
+collect_garbage()
+gc.threshold(GC_THRESHOLD)
+
+# time LUX + was held minus the time LUX - was held since adjust_brightness() last ran
+lux_held_ms = 0
+
+# samples the buttons every INPUT_POLL_MS, however long the current frame takes, and
+# counts how long LUX +/- are held in real time so brightness follows them at any FPS
+async def sample_input():
+    global lux_held_ms
+    last = time.ticks_ms()
+    while True:
+        buttons.poll()
+        now = time.ticks_ms()
+        elapsed = time.ticks_diff(now, last)
+        last = now
+        if buttons.is_held(CosmicUnicorn.SWITCH_BRIGHTNESS_UP):
+            lux_held_ms += elapsed
+        if buttons.is_held(CosmicUnicorn.SWITCH_BRIGHTNESS_DOWN):
+            lux_held_ms -= elapsed
+        await asyncio.sleep_ms(INPUT_POLL_MS)
+
+# returns the LUX +/- hold time counted so far and starts counting again
+def take_lux_held_ms():
+    global lux_held_ms
+    held, lux_held_ms = lux_held_ms, 0
+    return held
+
+# moves the brightness by BRIGHTNESS_RATE per second LUX + or - was held since the last call
+# returns True if the brightness changed
+def adjust_brightness():
+    global brightness
+    previous = brightness
+    brightness += BRIGHTNESS_RATE * take_lux_held_ms() / 1000
+    brightness = max(min(brightness, 1.0), 0.0)
+    cosmic.set_brightness(brightness)
+    return brightness != previous
+
+# returns the index of the button pressed in this event or None if it isn't an A/B/C/D press
+# 0: A, 1: B, 2: C, 3: D
+def pressed_index(event):
+    button, kind = event
+    if kind == PRESS and button in BUTTONS:
+        return BUTTONS.index(button)
     return None
 
-def wait_for_button_release():
-    while pressed_index() is not None:
-        time.sleep(0.05)
+# rendered menu screens, keyed by title (each title has one fixed set of options)
+menu_frames = {}
 
 def show_menu(title, options):
+    frame = menu_frames.get(title)
+    if frame is not None:
+        blit(graphics, frame)
+        cosmic.set_brightness(brightness)
+        cosmic.update(graphics)
+        return
     graphics.set_font("bitmap6")
-    graphics.set_pen(graphics.create_pen(0, 0, 0))
+    graphics.set_pen(BLACK)
     graphics.clear()
-    # Define four distinct colors (red, green, blue, yellow)
-    colors = [
-        graphics.create_pen(255, 0, 0),    # Red
-        graphics.create_pen(0, 255, 0),    # Green
-        graphics.create_pen(0, 128, 255),  # Blue
-        graphics.create_pen(255, 200, 0),  # Yellow
-    ]
     for i, (opt, _) in enumerate(options):
-        pen = colors[i % len(colors)]
+        pen = MENU_COLORS[i % len(MENU_COLORS)]
         graphics.set_pen(pen)
         y = MENU_TOP_START_Y + i * MENU_OPTION_SPACING_Y
         # Draw a small circle
         graphics.circle(MENU_LEFT_START_X + MENU_CIRCLE_RADIUS, y + MENU_CIRCLE_CENTER_OFFSET_Y, MENU_CIRCLE_RADIUS)
         # Draw the option text in the same color, offset right of the circle
         graphics.text(f"{opt}", MENU_LEFT_START_X + MENU_TEXT_OFFSET_X, y, -1, 1)
+    menu_frames[title] = snapshot(graphics)
     cosmic.set_brightness(brightness)
     cosmic.update(graphics)
 
-def menu_select(title, options):
-    # Show menu and wait for A/B/C/D
-    while True:
-        show_menu(title, options)
-        # brightness up/down
-        global brightness
-        if cosmic.is_pressed(CosmicUnicorn.SWITCH_BRIGHTNESS_UP):
-            brightness += 0.01
-        if cosmic.is_pressed(CosmicUnicorn.SWITCH_BRIGHTNESS_DOWN):
-            brightness -= 0.01
-        brightness = max(min(brightness, 1.0), 0.0)
-        cosmic.set_brightness(brightness)
-        idx = pressed_index()
-        if idx is not None and idx < len(options):
-            wait_for_button_release()
-            return idx
-        time.sleep(0.01)
+# prewarms after yielding, so the menu and the input task have had a turn first
+async def prewarm_effect(title, options):
+    await asyncio.sleep_ms(0)
+    registry.prewarm(title, options)
 
-def run_effect(effect_name):
+async def menu_select(title, options):
+    # Show menu and wait for A/B/C/D, the menu is only pushed again when the brightness changes
+    clock = FrameClock(MENU_FPS)
+    show_menu(title, options)
+    # import the effect we expect to be picked once the menu is up, unless it's picked first
+    prewarm = asyncio.create_task(prewarm_effect(title, options))
     try:
-        if effect_name is None:
-            import fire as effect
-        else:
-            effect = __import__(effect_name)
-        effect.graphics = graphics
-        effect.init()
-        sleep = False
-        was_sleep_pressed = False
         while True:
-            # if A, B, C, or D are pressed then reset to menu
-            if pressed_index() is not None:
-                machine.reset()
-            sleep_pressed = cosmic.is_pressed(CosmicUnicorn.SWITCH_SLEEP)
-            if sleep_pressed and not was_sleep_pressed:
-                sleep = not sleep
-            was_sleep_pressed = sleep_pressed
-            if sleep:
-                cosmic.set_brightness(cosmic.get_brightness() - 0.01)
-                if cosmic.get_brightness() > 0.0:
-                    effect.draw()
-                cosmic.update(graphics)
-            else:
-                effect.draw()
+            # brightness up/down
+            if adjust_brightness():
                 cosmic.update(graphics)
+            while buttons.pending():
+                idx = pressed_index(buttons.next_event())
+                if idx is not None and idx < len(options):
+                    return idx
+            await clock.wait()
+    finally:
+        prewarm.cancel()
+
+# Effects are modules with init() and draw(), and optionally:
+#   task()              coroutine run alongside the frames for as long as the effect is shown,
+#                       for work that waits on something (the network, audio) so draw() doesn't
+#   teardown()          release anything init() claimed (audio, buffers)
+#   on_button(button)   return True to keep an A/B/C/D press instead of leaving the effect
+#   invalidate()        redraw everything next frame, for effects that only draw what changed
+#   profile(enabled)    switch the effect's own profiling on or off, along with the overlay
+#   report()            print the effect's own statistics along with the profiler's
+#   PIPELINE = True     draw() is safe to run on core 1 while core 0 pushes the last frame
+#
+# draw() and teardown() may be coroutines too (unless PIPELINE is set), they are awaited
+# if they return one.
+# While an effect runs VOLUME + toggles the profiler overlay (and the effect's profiling) and
+# VOLUME - prints its timings.
+def is_pipelined(effect):
+    return pipeline is not None and getattr(effect, "PIPELINE", False)
+
+# pen cache of the effect's surface and its pins() before the effect's init(), the pins
+# taken after that are the effect's
+effect_pens = None
+effect_pins = 0
+
+def load_effect(effect_name):
+    global effect_pens, effect_pins
+    effect = registry.load(effect_name)
+    effect.graphics = pipeline.back if is_pipelined(effect) else graphics
+    effect.cu = cosmic
+    effect_pens = cache_for(effect.graphics)
+    effect_pins = effect_pens.pins()
+    effect.init()
+    return effect
+
+async def unload_effect(effect_name, effect):
+    try:
+        if effect is not None and hasattr(effect, "teardown"):
+            pending = effect.teardown()
+            if pending is not None:
+                await pending
+    finally:
+        # the effect's pens can be recycled for the next one
+        if effect_pens is not None:
+            effect_pens.unpin(effect_pins)
+        # drop the module so its globals and buffers can be reclaimed
+        registry.unload(effect_name)
+
+def report_effect(effect_name, effect):
+    profiler.report(effect_name)
+    if effect is not None and hasattr(effect, "report"):
+        effect.report()
+
+async def run_effect(effect_name):
+    if effect_name is None:
+        effect_name = "fire"
+    effect = None
+    effect_task = None
+    clock = None
+    pipelined = False
+    try:
+        effect = load_effect(effect_name)
+        if hasattr(effect, "task"):
+            effect_task = asyncio.create_task(effect.task())
+        clock = FrameClock(getattr(effect, "FPS", DEFAULT_FPS))
+        profiler.start(effect_name)
+        budget_us = clock.period_ms * 1000
+        if is_pipelined(effect):
+            pipeline.start(effect.draw)
+            pipelined = True
+            pipeline.submit()
+        sleep = False
+        overlay = False
+        running = True
+        frame_ms = time.ticks_ms()
+        while running:
+            started = profiler.begin()
+            # real time since the last frame, for the sleep fade
+            now = time.ticks_ms()
+            elapsed_ms = time.ticks_diff(now, frame_ms)
+            frame_ms = now
+            while buttons.pending():
+                event = buttons.next_event()
+                # if A, B, C, or D are pressed then return to the menu, unless the effect wants the press
+                idx = pressed_index(event)
+                if idx is not None:
+                    if not (hasattr(effect, "on_button") and effect.on_button(BUTTONS[idx])):
+                        running = False
+                elif event == (CosmicUnicorn.SWITCH_SLEEP, PRESS):
+                    sleep = not sleep
+                elif event == (CosmicUnicorn.SWITCH_VOLUME_UP, PRESS):
+                    overlay = not overlay
+                    if hasattr(effect, "profile"):
+                        effect.profile(overlay)
+                    if not overlay and hasattr(effect, "invalidate"):
+                        effect.invalidate()
+                elif event == (CosmicUnicorn.SWITCH_VOLUME_DOWN, PRESS):
+                    report_effect(effect_name, effect)
+                    registry.report()
+            if not running:
+                break
+            if not sleep:
                 # brightness up/down
-                global brightness
-                if cosmic.is_pressed(CosmicUnicorn.SWITCH_BRIGHTNESS_UP):
-                    brightness += 0.01
-                if cosmic.is_pressed(CosmicUnicorn.SWITCH_BRIGHTNESS_DOWN):
-                    brightness -= 0.01
-                brightness = max(min(brightness, 1.0), 0.0)
-                cosmic.set_brightness(brightness)
-            time.sleep(0.001)
+                adjust_brightness()
+            else:
+                # LUX +/- do nothing while asleep
+                take_lux_held_ms()
+            profiler.record(INPUT, started)
+
+            if pipelined and (not sleep or cosmic.get_brightness() > 0.0):
+                # take the frame core 1 drew meanwhile and have it start on the next one
+                await pipeline.collect()
+                pipeline.submit()
+                profiler.record_us(DRAW, pipeline.draw_us)
+            elif not sleep or cosmic.get_brightness() > 0.0:
+                started = profiler.begin()
+                heap_before = gc.mem_alloc()
+                pending = effect.draw()
+                if pending is not None:
+                    await pending
+                profiler.record_heap(gc.mem_alloc() - heap_before)
+                profiler.record(DRAW, started)
+            if overlay:
+                profiler.draw_overlay(graphics, OVERLAY_COLORS, budget_us)
+            if sleep:
+                cosmic.set_brightness(cosmic.get_brightness() - BRIGHTNESS_RATE * elapsed_ms / 1000)
+
+            started = profiler.begin()
+            cosmic.update(graphics)
+            profiler.record(UPDATE, started)
+            await clock.wait()
     except Exception as e:
         # fallback: show error and return to menu
-        graphics.set_pen(graphics.create_pen(255, 0, 0))
+        graphics.set_pen(ERROR_RED)
         graphics.clear()
         graphics.text("Error!", 2, 2, -1, 1)
         graphics.text(str(e), 2, 10, -1, 1)
         cosmic.update(graphics)
-        time.sleep(2)
-        machine.reset()
-
-# Main menu loop
-while True:
-    main_idx = menu_select("MENU", [(m[0], None) for m in MENU])
-    submenu = MENU[main_idx]
-    sub_idx = menu_select(submenu[0], submenu[1])
-    effect_name = submenu[1][sub_idx][1]
-    run_effect(effect_name)
+        await asyncio.sleep(2)
+    finally:
+        if effect_task is not None:
+            effect_task.cancel()
+            # wait for it to finish, so whatever it raised besides the cancellation is seen
+            try:
+                await effect_task
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                print("{} task failed: {!r}".format(effect_name, e))
+        if pipelined:
+            await pipeline.stop()
+        if clock is not None:
+            # just the overrun line, VOLUME - prints the full reports on demand
+            clock.report(effect_name)
+        await unload_effect(effect_name, effect)
+        cosmic.set_brightness(brightness)
+        buttons.clear()
+
+# Main menu loop, the buttons are sampled by their own task throughout
+async def main():
+    asyncio.create_task(sample_input())
+    while True:
+        main_idx = await menu_select("MENU", [(m[0], None) for m in MENU])
+        submenu = MENU[main_idx]
+        sub_idx = await menu_select(submenu[0], submenu[1])
+        effect_name = submenu[1][sub_idx][1]
+        registry.picked(submenu[0], effect_name)
+        await run_effect(effect_name)
+
+asyncio.run(main())
 
@@ -0,0 +1,109 @@
+"""
+A bounded cache of PicoGraphics pens keyed by RGB colour.
+
+create_pen() either packs a colour (RGB modes) or consumes a palette slot (P4/P8 modes),
+so calling it for the same constant colour every frame is wasted work at best and runs
+the palette out at worst. PenCache hands back the same pen for the same colour and, once
+full, evicts pens that have not been asked for recently using a clock (second chance) sweep.
+
+In palette modes an evicted slot is recoloured with update_pen() for the new colour, which
+would change every pen value still held for the old one. Pens kept in a global or a table
+must be asked for with get(..., pinned=True) so the sweep never takes their slot, and
+unpin(mark) releases the pins taken after pins() returned mark once their owner is done.
+"""
+
+MAX_PENS = 64
+
+
+class PenCache:
+    def __init__(self, graphics, size=MAX_PENS, palette=False):
+        self.__graphics = graphics
+        self.__size = size
+        self.__palette = palette        # Recycle evicted palette slots with update_pen
+
+        self.__pens = {}                # rgb -> (pen, slot)
+        self.__keys = [None] * size     # slot -> rgb
+        self.__used = bytearray(size)   # slot -> referenced since the last sweep
+        self.__pinned = []              # rgb of the pinned pens, in the order they were pinned
+        self.__hand = 0
+
+    @property
+    def graphics(self):
+        return self.__graphics
+
+    # returns the pen for a colour, pinned=True for pens the caller keeps beyond this frame
+    def get(self, r, g, b, pinned=False):
+        key = (r << 16) | (g << 8) | b
+        entry = self.__pens.get(key)
+        if entry is not None:
+            self.__used[entry[1]] = 1
+            if pinned and key not in self.__pinned:
+                self.__pinned.append(key)
+            return entry[0]
+
+        slot, evicted = self.__sweep()
+        if slot is None:
+            # every slot is pinned, hand out a pen of its own
+            return self.__graphics.create_pen(r, g, b)
+        if evicted is not None and self.__palette:
+            pen = evicted
+            self.__graphics.update_pen(pen, r, g, b)
+        else:
+            pen = self.__graphics.create_pen(r, g, b)
+
+        self.__pens[key] = (pen, slot)
+        self.__keys[slot] = key
+        self.__used[slot] = 1
+        if pinned:
+            self.__pinned.append(key)
+        return pen
+
+    # returns a mark for unpin(), the number of pens pinned so far
+    def pins(self):
+        return len(self.__pinned)
+
+    # lets the sweep evict the pens pinned since pins() returned mark again
+    def unpin(self, mark=0):
+        del self.__pinned[mark:]
+
+    def clear(self):
+        self.__pens.clear()
+        self.__pinned.clear()
+        for slot in range(self.__size):
+            self.__keys[slot] = None
+            self.__used[slot] = 0
+        self.__hand = 0
+
+    def __len__(self):
+        return len(self.__pens)
+
+    # returns a free slot, and the pen that was evicted from it if there was one
+    # the slot is None if every slot holds a pinned pen
+    def __sweep(self):
+        # two turns clear every referenced bit, so only pinned slots can be left after them
+        for _ in range(2 * self.__size):
+            slot = self.__hand
+            self.__hand = (slot + 1) % self.__size
+            key = self.__keys[slot]
+            if key is None:
+                return slot, None
+            if key in self.__pinned:
+                continue
+            if self.__used[slot]:
+                self.__used[slot] = 0
+                continue
+            pen = self.__pens.pop(key)[0]
+            return slot, pen
+        return None, None
+
+
+_caches = {}
+
+
+# returns the shared cache for a graphics surface, creating it on first use
+def cache_for(graphics, size=MAX_PENS, palette=False):
+    cache = _caches.get(id(graphics))
+    if cache is None or cache.graphics is not graphics:
+        cache = PenCache(graphics, size, palette)
+        _caches[id(graphics)] = cache
+    return cache
@@ -0,0 +1,85 @@
+"""
+Draws an effect's frames on the second core.
+
+The effect draws into a back surface on core 1 while core 0 pushes the previous frame from
+the front surface and handles input, audio and the other tasks. collect() waits for the
+frame being drawn, copies it to the front surface and submit() starts on the next one, so
+one frame's draw() overlaps the previous frame's update().
+
+Effects opt in with PIPELINE = True. Their draw() must only touch their own state and the
+surface they were given, as it runs alongside everything on core 0. The back surface keeps
+what was drawn into it, so effects that only redraw what changed still work, and anything
+drawn over the front surface (the profiler overlay) never ends up in the next frame.
+"""
+
+import time
+import asyncio
+import _thread
+from frames import blit
+
+IDLE_US = 100           # how often core 1 checks for the next frame while it has none
+
+
+class Pipeline:
+    def __init__(self, front, back):
+        self.__front = front
+        self.__back = back
+        self.__back_mv = memoryview(back)
+        self.__pending = False          # set by core 0 to request a frame, cleared by core 1
+        self.__stopping = False
+        self.__running = False
+        self.__error = None
+        self.draw_us = 0                # duration of the last draw() on core 1
+
+    @property
+    def back(self):
+        return self.__back
+
+    # starts core 1 waiting for frames to draw with draw()
+    def start(self, draw):
+        self.__pending = False
+        self.__stopping = False
+        self.__error = None
+        self.__running = True
+        _thread.start_new_thread(self.__run, (draw,))
+
+    # asks core 1 to draw the next frame into the back surface
+    def submit(self):
+        self.__pending = True
+
+    def busy(self):
+        return self.__pending
+
+    # waits for the submitted frame and copies it to the front surface
+    async def collect(self):
+        while self.__pending:
+            await asyncio.sleep_ms(0)
+        if self.__error is not None:
+            error, self.__error = self.__error, None
+            raise error
+        blit(self.__front, self.__back_mv)
+
+    # lets core 1 finish the frame it is on and return
+    async def stop(self):
+        self.__stopping = True
+        while self.__running:
+            await asyncio.sleep_ms(1)
+        self.__pending = False
+
+    def __run(self, draw):
+        try:
+            while True:
+                while not self.__pending:
+                    if self.__stopping:
+                        return
+                    time.sleep_us(IDLE_US)
+                started = time.ticks_us()
+                draw()
+                self.draw_us = time.ticks_diff(time.ticks_us(), started)
+                self.__pending = False
+        except Exception as e:
+            # handed to core 0 by the next collect()
+            self.__error = e
+            self.__pending = False
+        finally:
+            self.__running = False
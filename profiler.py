@@ -0,0 +1,120 @@
+"""
+Per-effect frame timing and heap accounting.
+
+main.py times each part of a frame (drawing, pushing to the display, handling input) with
+begin()/record() and the Profiler keeps the last WINDOW samples of each part for every
+effect. report() prints min/mean/p95/max over the USB serial console, and draw_overlay()
+shows the current effect's numbers as bars along the top of the display, so no font has to
+be swapped in underneath the effect.
+
+record_heap() keeps the bytes each effect's draw() allocated, once it has had WARMUP_FRAMES
+frames to settle. An effect that still allocates after that is flagged in report(), since
+every byte it allocates per frame brings the next garbage collection closer.
+"""
+
+import time
+from array import array
+
+SECTIONS = ("draw", "update", "input")
+
+DRAW = 0
+UPDATE = 1
+INPUT = 2
+
+WINDOW = 128            # samples kept for each section
+WARMUP_FRAMES = 60      # frames ignored by record_heap() after start()
+
+
+class Window:
+    def __init__(self, length=WINDOW):
+        self.samples = array("I", [0] * length)
+        self.index = 0
+        self.count = 0
+
+    def add(self, value):
+        self.samples[self.index] = value
+        self.index = (self.index + 1) % len(self.samples)
+        if self.count < len(self.samples):
+            self.count += 1
+
+    def mean(self):
+        if self.count == 0:
+            return 0
+        total = 0
+        for i in range(self.count):
+            total += self.samples[i]
+        return total // self.count
+
+    # returns (min, mean, p95, max) in microseconds
+    def stats(self):
+        if self.count == 0:
+            return 0, 0, 0, 0
+        ordered = sorted(self.samples[i] for i in range(self.count))
+        return ordered[0], self.mean(), ordered[(self.count - 1) * 95 // 100], ordered[-1]
+
+
+class Profiler:
+    def __init__(self, window=WINDOW):
+        self.__window = window
+        self.__effects = {}
+        self.__current = None
+        self.__name = None
+        self.__warmup = 0
+
+    # starts collecting samples for an effect, keeping any it already has
+    def start(self, name):
+        windows = self.__effects.get(name)
+        if windows is None:
+            # one window per section, then one for heap allocations
+            windows = [Window(self.__window) for _ in range(len(SECTIONS) + 1)]
+            self.__effects[name] = windows
+        self.__current = windows
+        self.__name = name
+        self.__warmup = WARMUP_FRAMES
+
+    @staticmethod
+    def begin():
+        return time.ticks_us()
+
+    def record(self, section, started):
+        self.__current[section].add(time.ticks_diff(time.ticks_us(), started))
+
+    # for sections timed elsewhere, such as a draw() on the other core
+    def record_us(self, section, elapsed_us):
+        self.__current[section].add(elapsed_us)
+
+    # allocated is the change in gc.mem_alloc() over one draw(), negative if a collection ran
+    def record_heap(self, allocated):
+        if self.__warmup > 0:
+            self.__warmup -= 1
+        elif allocated >= 0:
+            self.__current[-1].add(allocated)
+
+    def report(self, name=None):
+        names = [name] if name is not None else sorted(self.__effects)
+        for effect in names:
+            windows = self.__effects.get(effect)
+            if windows is None:
+                continue
+            print("{} (us)      min   mean    p95    max".format(effect))
+            for section, window in zip(SECTIONS, windows):
+                print("  {:<7}{:>7}{:>7}{:>7}{:>7}".format(section, *window.stats()))
+            heap = windows[-1]
+            print("  {:<7}{:>7}{:>7}{:>7}{:>7}  bytes/frame".format("heap", *heap.stats()))
+            if heap.count and heap.stats()[3] > 0:
+                print("  ! {} allocates in steady state".format(effect))
+
+    # draws one bar per section, full width being budget_us, with the p95 marked
+    def draw_overlay(self, graphics, pens, budget_us):
+        if self.__current is None:
+            return
+        width, _ = graphics.get_bounds()
+        graphics.set_pen(pens[0])
+        graphics.rectangle(0, 0, width, len(SECTIONS) * 2)
+        for section in range(len(SECTIONS)):
+            window = self.__current[section]
+            minimum, mean, p95, maximum = window.stats()
+            y = section * 2
+            graphics.set_pen(pens[1 + section])
+            graphics.line(0, y, min(width, mean * width // budget_us), y)
+            graphics.pixel(min(width - 1, p95 * width // budget_us), y)
@@ -2,12 +2,12 @@ import time
 import machine
 from cosmic import CosmicUnicorn
 from picographics import PicoGraphics, DISPLAY_COSMIC_UNICORN as DISPLAY
+from pens import cache_for
+from frames import snapshot, blit
 
-# Setup display and device
-cu = CosmicUnicorn()
-graphics = PicoGraphics(DISPLAY)
-graphics.set_font("bitmap6")
-cu.set_brightness(0.6)
+# Display and device, set by main.py (or main() below)
+cu = None
+graphics = None
 
 WIDTH = CosmicUnicorn.WIDTH
 HEIGHT = CosmicUnicorn.HEIGHT
@@ -17,6 +17,7 @@ LINE_ANIMATION_SPEED = 2.5     # Seconds between each line appearing
 FULL_RAINBOW_DURATION = 10.0     # Seconds to show full rainbow with heart
 WAIT_DURATION = 1.0            # Seconds to wait before restarting cycle
 FRAME_DELAY = 0.05              # Seconds between animation frames
+FPS = 20                        # Frame rate main.py runs draw() at
 
 # Animation state
 state = 0
@@ -36,43 +37,74 @@ RAINBOW_COLORS = [
     (238, 130, 238),  # Violet
 ]
 
+# Pens, resolved in init() for whichever graphics surface we are drawing to
+black_pen = None
+rainbow_pens = None
+
 # Animation phases
 PHASES = [
     "COLOR_BY_COLOR",  # Show rainbow colors one at a time
     "FULL_RAINBOW",    # Show full rainbow with black heart (includes wait time)
 ]
 
+# The timeline only ever shows 8 distinct images: frame 0-6 is one colour band of phase 0,
+# FULL_RAINBOW_FRAME the full rainbow with the heart of phase 1
+FULL_RAINBOW_FRAME = len(RAINBOW_COLORS)
+# snapshots of the frames drawn so far, blitted instead of drawing them again
+rendered = {}
+# the frame on the display surface, None when something else may have drawn over it
+shown = None
+
+
+# puts a frame on the surface, drawing it only the first time and not at all if it is already there
+def show(frame):
+    global shown
+    if frame == shown:
+        return
+    cached = rendered.get(frame)
+    if cached is not None:
+        blit(graphics, cached)
+    else:
+        if frame == FULL_RAINBOW_FRAME:
+            draw_full_rainbow_with_heart()
+        else:
+            draw_color_band(frame)
+        rendered[frame] = snapshot(graphics)
+    shown = frame
+
+
 def draw_rainbow_color_by_color():
     """Draw rainbow colors one at a time across the display"""
     global current_line
     
+    # Draw only the current color
+    show(min(current_line, len(RAINBOW_COLORS) - 1))
+    
+    # Move to next color based on elapsed time
+    elapsed_ms = time.ticks_diff(time.ticks_ms(), cycle_start)
+    elapsed_seconds = elapsed_ms / 1000.0
+    target_color = int(elapsed_seconds / LINE_ANIMATION_SPEED)  # One color per LINE_ANIMATION_SPEED seconds
+    current_line = min(target_color, len(RAINBOW_COLORS))
+
+
+def draw_color_band(current_color):
+    """Draw a single rainbow color band on black"""
     # Clear display
-    graphics.set_pen(graphics.create_pen(0, 0, 0))
+    graphics.set_pen(black_pen)
     graphics.clear()
     
     # Calculate color blocks: 4 rows per color + 2 padding rows at top and bottom
     padding_rows = 2
     rows_per_color = 4
-    total_colors = len(RAINBOW_COLORS)
-    
-    # Draw only the current color
-    current_color = min(current_line, total_colors - 1)
     
     # Calculate start and end rows for the current color only
     start_row = padding_rows + (current_color * rows_per_color)
     end_row = start_row + rows_per_color
     
     # Draw only the current color
-    r, g, b = RAINBOW_COLORS[current_color]
-    graphics.set_pen(graphics.create_pen(r, g, b))
+    graphics.set_pen(rainbow_pens[current_color])
     for y in range(start_row, end_row):
         graphics.line(0, y, WIDTH, y)
-    
-    # Move to next color based on elapsed time
-    elapsed_ms = time.ticks_diff(time.ticks_ms(), cycle_start)
-    elapsed_seconds = elapsed_ms / 1000.0
-    target_color = int(elapsed_seconds / LINE_ANIMATION_SPEED)  # One color per LINE_ANIMATION_SPEED seconds
-    current_line = min(target_color, total_colors)
 
 
 def draw_full_rainbow_with_heart():
@@ -84,15 +116,14 @@ def draw_full_rainbow_with_heart():
     for y in range(HEIGHT):
         if y < padding_rows or y >= HEIGHT - padding_rows:
             # Padding rows (black)
-            graphics.set_pen(graphics.create_pen(0, 0, 0))
+            graphics.set_pen(black_pen)
         else:
             # Color rows
             color_index = (y - padding_rows) // rows_per_color
             if color_index < len(RAINBOW_COLORS):
-                r, g, b = RAINBOW_COLORS[color_index]
-                graphics.set_pen(graphics.create_pen(r, g, b))
+                graphics.set_pen(rainbow_pens[color_index])
             else:
-                graphics.set_pen(graphics.create_pen(0, 0, 0))
+                graphics.set_pen(black_pen)
         graphics.line(0, y, WIDTH, y)
     
     # Draw black heart at center
@@ -100,8 +131,8 @@ def draw_full_rainbow_with_heart():
     heart_y = HEIGHT // 2
     heart_size = 3
     
-    # Create black pen for heart
-    graphics.set_pen(graphics.create_pen(0, 0, 0))
+    # Black pen for heart
+    graphics.set_pen(black_pen)
     
     # Heart shape pattern with notch at top
     heart_pattern = [
@@ -124,13 +155,6 @@ def draw_rainbow_animation():
     global state, last_switch, cycle_start, current_phase, current_line
     now = time.ticks_ms()
     
-    # Check if any buttons are pressed to exit
-    if (cu.is_pressed(CosmicUnicorn.SWITCH_A) or 
-        cu.is_pressed(CosmicUnicorn.SWITCH_B) or 
-        cu.is_pressed(CosmicUnicorn.SWITCH_C) or 
-        cu.is_pressed(CosmicUnicorn.SWITCH_D)):
-        machine.reset()
-    
     # Initialize cycle if needed
     if cycle_start == 0:
         cycle_start = now
@@ -157,27 +181,53 @@ def draw_rainbow_animation():
     if current_phase == 0:
         draw_rainbow_color_by_color()
     elif current_phase == 1:
-        draw_full_rainbow_with_heart()
-    
-    cu.update(graphics)
+        show(FULL_RAINBOW_FRAME)
 
 def init():
-    global state, last_switch, cycle_start, current_phase, current_line
+    global state, last_switch, cycle_start, current_phase, current_line, black_pen, rainbow_pens, shown
+    rendered.clear()
+    shown = None
     state = 0
     last_switch = time.ticks_ms()
     cycle_start = 0
     current_phase = 0
     current_line = 0
-    graphics.set_pen(graphics.create_pen(0, 0, 0))
+    graphics.set_font("bitmap6")
+    pens = cache_for(graphics)
+    black_pen = pens.get(0, 0, 0, pinned=True)
+    rainbow_pens = [pens.get(r, g, b, pinned=True) for r, g, b in RAINBOW_COLORS]
+    graphics.set_pen(black_pen)
     graphics.clear()
 
+# forget what is on screen so the next frame is put there again
+def invalidate():
+    global shown
+    shown = None
+
 def draw():
     draw_rainbow_animation()
 
+# drop the snapshots, they take a framebuffer each
+def teardown():
+    rendered.clear()
+
 def main():
+    global cu, graphics
+    # Setup display and device
+    cu = CosmicUnicorn()
+    graphics = PicoGraphics(DISPLAY)
+    cu.set_brightness(0.6)
     init()
     while True:
+        # Check if any buttons are pressed to exit
+        if (cu.is_pressed(CosmicUnicorn.SWITCH_A) or 
+            cu.is_pressed(CosmicUnicorn.SWITCH_B) or 
+            cu.is_pressed(CosmicUnicorn.SWITCH_C) or 
+            cu.is_pressed(CosmicUnicorn.SWITCH_D)):
+            machine.reset()
+
         draw()
+        cu.update(graphics)
         time.sleep(FRAME_DELAY)
 
 if __name__ == "__main__":
@@ -0,0 +1,124 @@
+"""
+The effects the menu can run, known by name without importing them.
+
+Registry.load() imports an effect module the first time it is needed and records how long
+the import took and how much heap it allocated. prewarm() imports the effect a menu is
+most likely to start (the one last picked from it) while the menu sits idle, so selecting
+it only costs init(). The import still runs in one go, so modules whose last import took
+longer than PREWARM_MAX_IMPORT_US are left to load() rather than stalling the menu.
+unload() drops a module again so its heap can be reclaimed.
+"""
+
+import gc
+import sys
+import time
+
+# only prewarm while at least this much heap would be left free
+PREWARM_MIN_FREE = 32 * 1024
+# and only modules that imported faster than this last time, a couple of input ticks
+PREWARM_MAX_IMPORT_US = 40_000
+
+
+class Entry:
+    def __init__(self, label, module):
+        self.label = label
+        self.module = module
+        self.imports = 0            # times the module has been imported
+        self.import_us = 0          # duration of the last import
+        self.heap_bytes = 0         # heap allocated by the last import, compiler garbage included
+
+
+class Registry:
+    # menu is main.MENU: [ (menu_name, [(option_name, effect_module_name or None)]) ]
+    def __init__(self, menu):
+        self.__entries = {}
+        self.__last_pick = {}
+        self.__prewarmed = None
+        for _, options in menu:
+            for label, module in options:
+                if module is not None and module not in self.__entries:
+                    self.__entries[module] = Entry(label, module)
+
+    def entry(self, module):
+        return self.__entries.get(module)
+
+    def is_loaded(self, module):
+        return module in sys.modules
+
+    # imports the effect module (if it isn't already) and returns it
+    def load(self, module):
+        if self.__prewarmed == module:
+            self.__prewarmed = None
+        else:
+            self.discard_prewarmed()
+        loaded = sys.modules.get(module)
+        if loaded is not None:
+            return loaded
+
+        entry = self.__entries.get(module)
+        if entry is None:
+            entry = Entry(module, module)
+            self.__entries[module] = entry
+
+        # collect first, so the module is allocated from a heap with as little fragmentation as can be.
+        # Its compiler garbage is left to the next collection between frames
+        gc.collect()
+        heap_before = gc.mem_alloc()
+        started = time.ticks_us()
+        loaded = __import__(module)
+        entry.import_us = time.ticks_diff(time.ticks_us(), started)
+        entry.heap_bytes = gc.mem_alloc() - heap_before
+        entry.imports += 1
+        return loaded
+
+    def unload(self, module):
+        if self.__prewarmed == module:
+            self.__prewarmed = None
+        if sys.modules.pop(module, None) is not None:
+            gc.collect()
+
+    # remembers the option picked from a menu, to guess what to prewarm next time
+    def picked(self, menu_name, module):
+        if module is not None:
+            self.__last_pick[menu_name] = module
+
+    # returns the module most likely to be picked from a menu, or None
+    def likely(self, menu_name, options):
+        module = self.__last_pick.get(menu_name)
+        if module is not None:
+            return module
+        for _, module in options:
+            if module is not None:
+                return module
+        return None
+
+    # imports the likely pick for a menu ahead of time, dropping any earlier guess
+    def prewarm(self, menu_name, options):
+        module = self.likely(menu_name, options)
+        if module is None or module == self.__prewarmed:
+            return
+        self.discard_prewarmed()
+        if self.is_loaded(module) or gc.mem_free() < PREWARM_MIN_FREE:
+            return
+        entry = self.__entries.get(module)
+        if entry is not None and entry.import_us > PREWARM_MAX_IMPORT_US:
+            return
+        try:
+            self.load(module)
+        except Exception as e:
+            # leave it to load() to fail again (and show the error) if it is picked
+            print("prewarm {} failed: {}".format(module, e))
+            self.unload(module)
+            return
+        self.__prewarmed = module
+
+    # drops a prewarmed module that wasn't picked
+    def discard_prewarmed(self):
+        if self.__prewarmed is not None:
+            self.unload(self.__prewarmed)
+
+    def report(self):
+        print("effect              imports  import us  heap bytes")
+        for module in sorted(self.__entries):
+            entry = self.__entries[module]
+            print("{:<20}{:>7}{:>11}{:>12}".format(module, entry.imports, entry.import_us, entry.heap_bytes))
@@ -1,6 +1,7 @@
 import time
 from cosmic import CosmicUnicorn
 from picographics import PicoGraphics, DISPLAY_COSMIC_UNICORN as DISPLAY
+from pens import cache_for
 
 '''
 Display scrolling wisdom, quotes or greetz.
@@ -16,10 +17,16 @@ BACKGROUND_COLOUR = (10, 0, 96)
 MESSAGE = "\"Space is big. Really big. You just won't believe how vastly hugely mind-bogglingly big it is. I mean, you may think it's a long way down the road to the chemist, but that's just peanuts to space.\" - Douglas Adams"
 HOLD_TIME = 2.0
 STEP_TIME = 0.075
+FPS = 30  # frame rate main.py runs draw() at
 
-# create cosmic object and graphics surface for drawing
-cu = CosmicUnicorn()
-graphics = PicoGraphics(DISPLAY)
+# cosmic object and graphics surface for drawing, set by main.py (or main() below)
+cu = None
+graphics = None
+
+# Pens, resolved in init() for whichever graphics surface we are drawing to
+MESSAGE_PEN = None
+OUTLINE_PEN = None
+BACKGROUND_PEN = None
 
 width = CosmicUnicorn.WIDTH
 height = CosmicUnicorn.HEIGHT
@@ -27,7 +34,7 @@ height = CosmicUnicorn.HEIGHT
 
 # function for drawing outlined text
 def outline_text(text, x, y):
-    graphics.set_pen(graphics.create_pen(int(OUTLINE_COLOUR[0]), int(OUTLINE_COLOUR[1]), int(OUTLINE_COLOUR[2])))
+    graphics.set_pen(OUTLINE_PEN)
     graphics.text(text, x - 1, y - 1, -1, 1)
     graphics.text(text, x, y - 1, -1, 1)
     graphics.text(text, x + 1, y - 1, -1, 1)
@@ -37,12 +44,10 @@ def outline_text(text, x, y):
     graphics.text(text, x, y + 1, -1, 1)
     graphics.text(text, x + 1, y + 1, -1, 1)
 
-    graphics.set_pen(graphics.create_pen(int(MESSAGE_COLOUR[0]), int(MESSAGE_COLOUR[1]), int(MESSAGE_COLOUR[2])))
+    graphics.set_pen(MESSAGE_PEN)
     graphics.text(text, x, y, -1, 1)
 
 
-cu.set_brightness(0.5)
-
 # state constants
 STATE_PRE_SCROLL = 0
 STATE_SCROLLING = 1
@@ -50,23 +55,32 @@ STATE_POST_SCROLL = 2
 
 shift = 0
 state = STATE_PRE_SCROLL
+msg_width = 0
+last_time = 0
 
-# set the font
-graphics.set_font("bitmap8")
 
-# calculate the message width so scrolling can happen
-msg_width = graphics.measure_text(MESSAGE, 1)
+def init():
+    global MESSAGE_PEN, OUTLINE_PEN, BACKGROUND_PEN, shift, state, msg_width, last_time
+    pens = cache_for(graphics)
+    MESSAGE_PEN = pens.get(*MESSAGE_COLOUR, pinned=True)
+    OUTLINE_PEN = pens.get(*OUTLINE_COLOUR, pinned=True)
+    BACKGROUND_PEN = pens.get(*BACKGROUND_COLOUR, pinned=True)
 
-last_time = time.ticks_ms()
+    shift = 0
+    state = STATE_PRE_SCROLL
 
-while True:
-    time_ms = time.ticks_ms()
+    # set the font
+    graphics.set_font("bitmap8")
 
-    if cu.is_pressed(CosmicUnicorn.SWITCH_BRIGHTNESS_UP):
-        cu.adjust_brightness(+0.01)
+    # calculate the message width so scrolling can happen
+    msg_width = graphics.measure_text(MESSAGE, 1)
 
-    if cu.is_pressed(CosmicUnicorn.SWITCH_BRIGHTNESS_DOWN):
-        cu.adjust_brightness(-0.01)
+    last_time = time.ticks_ms()
+
+
+def draw():
+    global shift, state, last_time
+    time_ms = time.ticks_ms()
 
     if state == STATE_PRE_SCROLL and time_ms - last_time > HOLD_TIME * 1000:
         if msg_width + PADDING * 2 >= width:
@@ -84,13 +98,34 @@ while True:
         shift = 0
         last_time = time_ms
 
-    graphics.set_pen(graphics.create_pen(int(BACKGROUND_COLOUR[0]), int(BACKGROUND_COLOUR[1]), int(BACKGROUND_COLOUR[2])))
+    graphics.set_pen(BACKGROUND_PEN)
     graphics.clear()
 
     outline_text(MESSAGE, x=PADDING - shift, y=2)
 
-    # update the display
-    cu.update(graphics)
 
-    # pause for a moment (important or the USB serial device will fail)
-    time.sleep(0.001)
+def main():
+    global cu, graphics
+    # create cosmic object and graphics surface for drawing
+    cu = CosmicUnicorn()
+    graphics = PicoGraphics(DISPLAY)
+    cu.set_brightness(0.5)
+    init()
+    while True:
+        if cu.is_pressed(CosmicUnicorn.SWITCH_BRIGHTNESS_UP):
+            cu.adjust_brightness(+0.01)
+
+        if cu.is_pressed(CosmicUnicorn.SWITCH_BRIGHTNESS_DOWN):
+            cu.adjust_brightness(-0.01)
+
+        draw()
+
+        # update the display
+        cu.update(graphics)
+
+        # pause for a moment (important or the USB serial device will fail)
+        time.sleep(0.001)
+
+
+if __name__ == "__main__":
+    main()
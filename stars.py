@@ -2,10 +2,11 @@ import time
 import machine
 from cosmic import CosmicUnicorn
 from picographics import PicoGraphics, DISPLAY_COSMIC_UNICORN as DISPLAY
+from pens import cache_for
+from buttons import Buttons, PRESS
 import math
 import random
 
-cosmic = CosmicUnicorn()
 '''
 Display scrolling wisdom, quotes or greetz.
 
@@ -13,9 +14,6 @@ You can adjust the brightness with LUX + and -.
 '''
 
 
-# returns the id of the button that is currently pressed or
-# None if none are
-
 # constants for controlling scrolling text
 PADDING = 5
 MESSAGE_COLOUR = (255, 0, 0)
@@ -24,29 +22,21 @@ BLUE_SKY_COLOR = (5,6,25)
 BACKGROUND_COLOUR = (0, 0, 0)
 HOLD_TIME_S = 2.0
 STEP_TIME = 0.05
+FPS = 30  # frame rate main.py runs draw() at
 
-# create cosmic object and graphics surface for drawing
-cu = CosmicUnicorn()
-graphics = PicoGraphics(DISPLAY)
+# cosmic object and graphics surface for drawing, set by main.py (or main() below)
+cu = None
+graphics = None
 
-# Basic settings
-graphics.set_font("bitmap4")
-cu.set_brightness(0.8)
+# Pens, resolved in init() for whichever graphics surface we are drawing to
+pens = None
+STAR_PEN = None
+CORNER_PEN = None
+EDGE_PEN = None
 
 width = CosmicUnicorn.WIDTH
 height = CosmicUnicorn.HEIGHT
 
-def pressed():
-    if cu.is_pressed(CosmicUnicorn.SWITCH_A):
-        return CosmicUnicorn.SWITCH_A
-    if cu.is_pressed(CosmicUnicorn.SWITCH_B):
-        return CosmicUnicorn.SWITCH_B
-    if cu.is_pressed(CosmicUnicorn.SWITCH_C):
-        return CosmicUnicorn.SWITCH_C
-    if cu.is_pressed(CosmicUnicorn.SWITCH_D):
-        return CosmicUnicorn.SWITCH_D
-    return None
-
 # Create class responsible for displaying a pixel star with surrounding pixels responsible for twinkling effect
 # with center white but up and side pixels with lower intensity
 class Star:
@@ -70,26 +60,26 @@ class Star:
         twinkle_intensity = 0.1 + 0.1 * math.sin(twinkle_time * 2 * math.pi / (self.twinkle_frequency * 1000))
         twinkle_intensity = max(0, min(0.2, twinkle_intensity))        
         # Draw the center pixel
-        graphics.set_pen(graphics.create_pen(255, 255, 255))
+        graphics.set_pen(STAR_PEN)
         graphics.pixel(self.x, self.y)
         # Draw the surrounding pixels with lower intensity
-        graphics.set_pen(graphics.create_pen(int(10), int(10), int(10)))
+        graphics.set_pen(CORNER_PEN)
         graphics.pixel(self.x+1, self.y - 1)
         graphics.pixel(self.x+1, self.y + 1)
         graphics.pixel(self.x - 1, self.y-1)
         graphics.pixel(self.x - 1, self.y+1)
         # Draw the surrounding pixels based on twinkle direction
-        graphics.set_pen(graphics.create_pen(int(255*0.1), int(255*0.1), int(255*0.1)))
+        graphics.set_pen(EDGE_PEN)
         graphics.pixel(self.x, self.y - 1)
         graphics.pixel(self.x, self.y + 1)
         graphics.pixel(self.x - 1, self.y)
         graphics.pixel(self.x + 1, self.y)
+        twinkle = int(255 * twinkle_intensity)
+        graphics.set_pen(pens.get(twinkle, twinkle, twinkle))
         if self.twinkle_direction == 1:
-            graphics.set_pen(graphics.create_pen(int(255 * twinkle_intensity), int(255 * twinkle_intensity), int(255 * twinkle_intensity)))
             graphics.pixel(self.x, self.y - 1)
             graphics.pixel(self.x, self.y + 1)
         else:
-            graphics.set_pen(graphics.create_pen(int(255 * twinkle_intensity), int(255 * twinkle_intensity), int(255 * twinkle_intensity)))
             graphics.pixel(self.x - 1, self.y)
             graphics.pixel(self.x + 1, self.y)
         # Switch twinkle direction when twinkle frequency is reached
@@ -101,14 +91,11 @@ def draw_text(lines, star_count):
     # Go from light to dark text
     grey = 160 - star_count * 10
     # Draw the text
-    graphics.set_pen(graphics.create_pen(grey, grey, grey))
+    graphics.set_pen(pens.get(grey, grey, grey))
     for i, line in enumerate(lines):
         graphics.text(line, 0, 19 + i * 6, wordwrap=-1, scale=1)
 
-# Create a list of stars starting with 1
-stars = [Star(4,4)]
 star_introduction_duration_s = 5
-last_star_introduction_time = time.ticks_ms()
 star_text = (
     "Blue",
     "Bath",
@@ -131,21 +118,34 @@ star_text = (
     "Sheep",
     "Sleep"
 )
-star_display_text_lines = (star_text[0], star_text[1])
-while True:
-    # if A, B, C, or D are pressed then reset
-    if pressed() is not None:
-        machine.reset()
 
-    if cu.is_pressed(CosmicUnicorn.SWITCH_BRIGHTNESS_UP):
-        cu.adjust_brightness(+0.01)
+# Animation state
+stars = []
+last_star_introduction_time = 0
+star_display_text_lines = ()
+
+
+def init():
+    global pens, STAR_PEN, CORNER_PEN, EDGE_PEN
+    global stars, last_star_introduction_time, star_display_text_lines
+    pens = cache_for(graphics)
+    STAR_PEN = pens.get(255, 255, 255, pinned=True)
+    CORNER_PEN = pens.get(10, 10, 10, pinned=True)
+    EDGE_PEN = pens.get(int(255 * 0.1), int(255 * 0.1), int(255 * 0.1), pinned=True)
+    graphics.set_font("bitmap4")
 
-    if cu.is_pressed(CosmicUnicorn.SWITCH_BRIGHTNESS_DOWN):
-        cu.adjust_brightness(-0.01)
+    # Create a list of stars starting with 1
+    stars = [Star(4,4)]
+    last_star_introduction_time = time.ticks_ms()
+    star_display_text_lines = (star_text[0], star_text[1])
+
+
+def draw():
+    global last_star_introduction_time, star_display_text_lines
     # Create a star object
     # As the number of stars increases move towards black background
     # max blue 46,68,130
-    graphics.set_pen(graphics.create_pen(int(BLUE_SKY_COLOR[0]*(1-len(stars)/10)), int(BLUE_SKY_COLOR[1]*(1-len(stars)/10)), int(BLUE_SKY_COLOR[2]*(1-len(stars)/10))))
+    graphics.set_pen(pens.get(int(BLUE_SKY_COLOR[0]*(1-len(stars)/10)), int(BLUE_SKY_COLOR[1]*(1-len(stars)/10)), int(BLUE_SKY_COLOR[2]*(1-len(stars)/10))))
     graphics.clear()
     # Draw the stars
     for star in stars:
@@ -164,11 +164,44 @@ while True:
                 stars.append(Star(x, y, random.randint(5, 10)/10))
                 last_star_introduction_time = time.ticks_ms()
                 break
-    
+
     draw_text(star_display_text_lines, len(stars))
-    # update the display
-    cu.update(graphics)
 
-    # pause for a moment (important or the USB serial device will fail)
-    time.sleep(0.01)
 
+def teardown():
+    global stars
+    stars = []
+
+
+def main():
+    global cu, graphics
+    # create cosmic object and graphics surface for drawing
+    cu = CosmicUnicorn()
+    graphics = PicoGraphics(DISPLAY)
+    cu.set_brightness(0.8)
+    buttons = Buttons(cu)
+    init()
+    while True:
+        buttons.poll()
+        while buttons.pending():
+            button, kind = buttons.next_event()
+            # if A, B, C, or D are pressed then reset
+            if kind == PRESS and button in (CosmicUnicorn.SWITCH_A, CosmicUnicorn.SWITCH_B, CosmicUnicorn.SWITCH_C, CosmicUnicorn.SWITCH_D):
+                machine.reset()
+
+        if buttons.is_held(CosmicUnicorn.SWITCH_BRIGHTNESS_UP):
+            cu.adjust_brightness(+0.01)
+
+        if buttons.is_held(CosmicUnicorn.SWITCH_BRIGHTNESS_DOWN):
+            cu.adjust_brightness(-0.01)
+
+        draw()
+        # update the display
+        cu.update(graphics)
+
+        # pause for a moment (important or the USB serial device will fail)
+        time.sleep(0.01)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,40 +1,87 @@
 import random
 from cosmic import CosmicUnicorn
+from pens import cache_for
 
 graphics = None
 
 colour = (230, 150, 0)
 
+# frame rate main.py runs draw() at, ages and lifetimes below are counted in frames
+FPS = 40
+# draw() only touches its own buffers and graphics, main.py may run it on the second core
+PIPELINE = True
+
+# each pixel lives for LIFETIME frames plus up to LIFETIME_SPREAD extra frames
+LIFETIME = 40
+LIFETIME_SPREAD = 4
+# fully lit for the first 30% of its life, fading out until 50%, then dark
+LIT_UNTIL = 0.3
+DARK_FROM = 0.5
+# number of brightness steps used for the fade out
+LEVELS = 16
+
+width = CosmicUnicorn.WIDTH
+height = CosmicUnicorn.HEIGHT
+
+# per-pixel age and lifetime in frames
+age = bytearray(width * height)
+lifetime = bytearray(width * height)
+# brightness level for every (lifetime, age) pair, one row of CURVE_STRIDE ages per lifetime
+CURVE_STRIDE = LIFETIME + LIFETIME_SPREAD + 1
+curve = bytearray((LIFETIME_SPREAD + 1) * CURVE_STRIDE)
+# brightness level last written to each pixel
+shown = bytearray(width * height)
+pens = None
+
 
 def init():
-    global width, height, lifetime, age
-    width = CosmicUnicorn.WIDTH
-    height = CosmicUnicorn.HEIGHT
-    lifetime = [[0.0 for y in range(height)] for x in range(width)]
-    age = [[0.0 for y in range(height)] for x in range(width)]
-    for y in range(height):
-        for x in range(width):
-            lifetime[x][y] = 1.0 + random.uniform(0.0, 0.1)
-            age[x][y] = random.uniform(0.0, 1.0) * lifetime[x][y]
+    global pens
+    cache = cache_for(graphics)
+    pens = [
+        cache.get(colour[0] * level // (LEVELS - 1), colour[1] * level // (LEVELS - 1), colour[2] * level // (LEVELS - 1), pinned=True)
+        for level in range(LEVELS)
+    ]
+
+    for life in range(LIFETIME, CURVE_STRIDE):
+        for frames in range(life + 1):
+            if frames < life * LIT_UNTIL:
+                level = LEVELS - 1
+            elif frames < life * DARK_FROM:
+                decay = (life * DARK_FROM - frames) / (life * (DARK_FROM - LIT_UNTIL))
+                level = int(decay * (LEVELS - 1))
+            else:
+                level = 0
+            curve[(life - LIFETIME) * CURVE_STRIDE + frames] = level
+
+    for i in range(width * height):
+        lifetime[i] = LIFETIME + random.randint(0, LIFETIME_SPREAD)
+        age[i] = random.randint(0, lifetime[i] - 1)
+    invalidate()
+
+
+# forget what is on screen so the next frame redraws every pixel
+def invalidate():
+    for i in range(len(shown)):
+        shown[i] = 0xFF
 
 
 @micropython.native  # noqa: F821
 def draw():
+    i = 0
     for y in range(height):
         for x in range(width):
-            if age[x][y] >= lifetime[x][y]:
-                age[x][y] = 0.0
-                lifetime[x][y] = 1.0 + random.uniform(0.0, 0.1)
-
-            age[x][y] += 0.025
+            frames = age[i]
+            life = lifetime[i]
+            if frames >= life:
+                frames = 0
+                life = LIFETIME + random.randint(0, LIFETIME_SPREAD)
+                lifetime[i] = life
+            frames += 1
+            age[i] = frames
 
-    for y in range(height):
-        for x in range(width):
-            if age[x][y] < lifetime[x][y] * 0.3:
-                graphics.set_pen(graphics.create_pen(colour[0], colour[1], colour[2]))
-            elif age[x][y] < lifetime[x][y] * 0.5:
-                decay = (lifetime[x][y] * 0.5 - age[x][y]) * 5.0
-                graphics.set_pen(graphics.create_pen(int(decay * colour[0]), int(decay * colour[1]), int(decay * colour[2])))
-            else:
-                graphics.set_pen(0)
-            graphics.pixel(x, y)
+            level = curve[(life - LIFETIME) * CURVE_STRIDE + frames]
+            if shown[i] != level:
+                shown[i] = level
+                graphics.set_pen(pens[level])
+                graphics.pixel(x, y)
+            i += 1
@@ -0,0 +1,79 @@
+import os
+import sys
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import host                 # noqa: E402
+
+host.install()
+from host import adpcm      # noqa: E402
+from audio import WavPlayer, IMA_STEPS, _decode_ima     # noqa: E402
+
+BLOCK_ALIGN = 64            # per channel, small so a few hundred frames span several blocks
+
+
+# decodes blocks the way adpcm.decode_sample() does, sample by sample
+def reference(data, channels, block_align):
+    out = []
+    for block in range(0, len(data), block_align):
+        chunk = data[block:block + block_align]
+        if len(chunk) < 4 * channels:
+            break
+        groups = (len(chunk) - 4 * channels) // (4 * channels)
+        decoded = []
+        for ch in range(channels):
+            predictor = int.from_bytes(chunk[4 * ch:4 * ch + 2], "little", signed=True)
+            index = min(chunk[4 * ch + 2], 88)
+            samples = [predictor]
+            for group in range(groups):
+                start = 4 * channels + 4 * channels * group + 4 * ch
+                for byte in chunk[start:start + 4]:
+                    for code in (byte & 0xF, byte >> 4):
+                        predictor, index = adpcm.decode_sample(code, predictor, index)
+                        samples.append(predictor)
+            decoded.append(samples)
+        for frame in range(groups * 8 + 1):
+            out.extend(decoded[ch][frame] for ch in range(channels))
+    return out
+
+
+def decode(data, channels, block_align):
+    length = WavPlayer._WavPlayer__adpcm_decoded_length(len(data), block_align, channels)
+    out = bytearray(length)         # exactly the size the player allocates, ptr16 raises past it
+    written = _decode_ima(data, len(data), block_align, out, channels, IMA_STEPS)
+    assert written * 2 == length
+    return list(memoryview(out).cast("h"))
+
+
+def encoded(channels, frames):
+    rng = random.Random(channels * 1000 + frames)
+    samples = [int(8000 * ((i // channels) % 50 - 25) / 25) + rng.randint(-500, 500) for i in range(frames * channels)]
+    return bytes(adpcm.encode(samples, channels, BLOCK_ALIGN)), samples
+
+
+def check(channels, frames):
+    data, samples = encoded(channels, frames)
+    block_align = BLOCK_ALIGN * channels
+    decoded = decode(data, channels, block_align)
+    assert decoded == reference(data, channels, block_align)
+    # the first sample of every block is stored exactly
+    per_block = adpcm.frames_per_block(channels, BLOCK_ALIGN)
+    for first in range(0, frames, per_block):
+        assert decoded[first * channels:first * channels + channels] == samples[first * channels:first * channels + channels]
+
+
+def test_mono_round_trip_with_a_partial_last_block():
+    check(1, 5 * adpcm.frames_per_block(1, BLOCK_ALIGN) + 37)
+
+
+def test_stereo_round_trip_with_a_partial_last_block():
+    check(2, 5 * adpcm.frames_per_block(2, BLOCK_ALIGN) + 37)
+
+
+def test_truncated_stereo_block_decodes_whole_groups_of_both_channels():
+    data, _ = encoded(2, 3 * adpcm.frames_per_block(2, BLOCK_ALIGN))
+    block_align = BLOCK_ALIGN * 2
+    # cut the last block after channel 0's third group but before channel 1's
+    data = data[:2 * block_align + 8 + 2 * 8 + 4]
+    assert decode(data, 2, block_align) == reference(data, 2, block_align)
@@ -0,0 +1,78 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import host                 # noqa: E402
+
+host.install()
+from cosmic import CosmicUnicorn        # noqa: E402
+from buttons import Buttons, PRESS, RELEASE, LONG_PRESS, DEBOUNCE_MS, LONG_PRESS_MS, QUEUE_LENGTH     # noqa: E402
+
+A = CosmicUnicorn.SWITCH_A
+B = CosmicUnicorn.SWITCH_B
+TICK_MS = 10
+
+
+# polls every TICK_MS from start up to (not including) end, returning the time after
+def poll(buttons, start, end):
+    for now in range(start, end, TICK_MS):
+        buttons.poll(now)
+    return end
+
+
+def events(buttons):
+    found = []
+    while buttons.pending():
+        found.append(buttons.next_event())
+    return found
+
+
+def test_bounce_shorter_than_the_debounce_gives_no_press():
+    cu = CosmicUnicorn()
+    buttons = Buttons(cu)
+    now = poll(buttons, 0, 100)
+    cu.press(A)
+    now = poll(buttons, now, now + DEBOUNCE_MS - TICK_MS)
+    cu.release(A)
+    poll(buttons, now, now + 200)
+    assert events(buttons) == []
+    assert not buttons.is_held(A)
+
+
+def test_press_and_release_past_the_debounce():
+    cu = CosmicUnicorn()
+    buttons = Buttons(cu)
+    cu.press(A)
+    now = poll(buttons, 0, 100)
+    assert buttons.is_held(A)
+    cu.release(A)
+    poll(buttons, now, now + 100)
+    assert events(buttons) == [(A, PRESS), (A, RELEASE)]
+
+
+def test_hold_past_the_long_press_time_gives_one_long_press():
+    cu = CosmicUnicorn()
+    buttons = Buttons(cu)
+    cu.press(A)
+    now = poll(buttons, 0, DEBOUNCE_MS + LONG_PRESS_MS + 2000)
+    cu.release(A)
+    poll(buttons, now, now + 100)
+    assert events(buttons) == [(A, PRESS), (A, LONG_PRESS), (A, RELEASE)]
+
+
+def test_full_queue_drops_the_oldest_events():
+    cu = CosmicUnicorn()
+    buttons = Buttons(cu)
+    now = 0
+    pushed = []
+    for tap in range(QUEUE_LENGTH):
+        switch = A if tap % 2 == 0 else B
+        cu.press(switch)
+        now = poll(buttons, now, now + 100)
+        cu.release(switch)
+        now = poll(buttons, now, now + 100)
+        pushed += [(switch, PRESS), (switch, RELEASE)]
+    assert buttons.pending() == QUEUE_LENGTH
+    assert events(buttons) == pushed[-QUEUE_LENGTH:]
+    assert buttons.next_event() is None
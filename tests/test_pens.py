@@ -0,0 +1,52 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pens import PenCache   # noqa: E402
+
+
+# a P4/P8 style surface: create_pen() takes the next palette slot, update_pen() recolours one
+class PaletteGraphics:
+    def __init__(self):
+        self.palette = []
+
+    def create_pen(self, r, g, b):
+        self.palette.append((r, g, b))
+        return len(self.palette) - 1
+
+    def update_pen(self, pen, r, g, b):
+        self.palette[pen] = (r, g, b)
+
+
+def test_pinned_pen_keeps_its_colour_when_the_cache_fills():
+    graphics = PaletteGraphics()
+    cache = PenCache(graphics, size=4, palette=True)
+    black = cache.get(0, 0, 0, pinned=True)
+    for level in range(1, 64):
+        cache.get(level, level, level)
+    assert graphics.palette[black] == (0, 0, 0)
+    assert cache.get(0, 0, 0) == black
+
+
+def test_unpinned_pens_are_recycled():
+    graphics = PaletteGraphics()
+    cache = PenCache(graphics, size=4, palette=True)
+    mark = cache.pins()
+    cache.get(1, 1, 1, pinned=True)
+    cache.unpin(mark)
+    for level in range(2, 64):
+        cache.get(level, level, level)
+    assert len(graphics.palette) == 4
+
+
+def test_all_slots_pinned_hands_out_uncached_pens():
+    graphics = PaletteGraphics()
+    cache = PenCache(graphics, size=2, palette=True)
+    first = cache.get(1, 1, 1, pinned=True)
+    second = cache.get(2, 2, 2, pinned=True)
+    extra = cache.get(3, 3, 3)
+    assert graphics.palette[first] == (1, 1, 1)
+    assert graphics.palette[second] == (2, 2, 2)
+    assert graphics.palette[extra] == (3, 3, 3)
+    assert len(cache) == 2
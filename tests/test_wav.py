@@ -0,0 +1,65 @@
+import os
+import sys
+import struct
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import host                 # noqa: E402
+
+host.install()
+from machine import I2S     # noqa: E402
+from audio import WavPlayer     # noqa: E402
+
+
+def chunk(chunk_id, body):
+    return chunk_id + struct.pack("<I", len(body)) + body + b"\0" * (len(body) & 1)
+
+
+def fmt(channels=1, rate=22_050, bits=16):
+    block_align = channels * bits // 8
+    return chunk(b"fmt ", struct.pack("<HHIIHH", 1, channels, rate, rate * block_align, block_align, bits))
+
+
+def riff(*chunks):
+    body = b"WAVE" + b"".join(chunks)
+    return b"RIFF" + struct.pack("<I", len(body)) + body
+
+
+def index(tmp_path, **files):
+    for name, data in files.items():
+        (tmp_path / name).write_bytes(data)
+    return WavPlayer(0, 10, 11, 9, root=str(tmp_path))
+
+
+def test_list_chunk_before_data_is_skipped(tmp_path):
+    info = chunk(b"LIST", b"INFOISFT" + struct.pack("<I", 6) + b"host\0\0")
+    data = bytes(range(200))
+    player = index(tmp_path, **{"a.wav": riff(fmt(2, 44_100), info, chunk(b"data", data))})
+    size, format, rate, bits, offset, sample_size, block_align = player.asset_info("a.wav")
+    assert (format, rate, bits, sample_size, block_align) == (I2S.STEREO, 44_100, 16, len(data), 0)
+    assert (tmp_path / "a.wav").read_bytes()[offset:offset + sample_size] == data
+
+
+def test_odd_sized_chunks_are_padded(tmp_path):
+    odd = chunk(b"junk", b"xyz")
+    data = bytes(range(100))
+    player = index(tmp_path, **{"b.wav": riff(fmt(), odd, chunk(b"data", data))})
+    offset, sample_size = player.asset_info("b.wav")[4:6]
+    assert (tmp_path / "b.wav").read_bytes()[offset:offset + sample_size] == data
+
+
+def test_truncated_data_chunk_is_cut_to_the_file(tmp_path):
+    wav = riff(fmt(), chunk(b"data", bytes(1000)))[:-400]
+    player = index(tmp_path, **{"c.wav": wav})
+    offset, sample_size = player.asset_info("c.wav")[4:6]
+    assert offset + sample_size == len(wav)
+
+
+def test_non_wav_files_are_not_indexed(tmp_path):
+    player = index(tmp_path, **{
+        "text.wav": b"not a wav file at all",
+        "aiff.wav": b"FORM" + struct.pack(">I", 4) + b"AIFF",
+        "nodata.wav": riff(fmt()),
+    })
+    for name in ("text.wav", "aiff.wav", "nodata.wav"):
+        assert player.asset_info(name) is None
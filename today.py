@@ -1,7 +1,11 @@
 import time
+import struct
+import socket
+import asyncio
 import network
 import ntptime
 import machine
+from pens import cache_for
 
 # You will need to create or update the file secrets.py with your network credentials using Thonny
 # in order for the example to update using the NTP.
@@ -14,9 +18,13 @@ try:
     from secrets import WIFI_SSID, WIFI_PASSWORD
 except ImportError:
     print("Create secrets.py with your WiFi credentials")
+    WIFI_SSID = WIFI_PASSWORD = None
 
 graphics = None
 
+# frame rate main.py runs draw() at, the date only changes once a day
+FPS = 1
+
 WIDTH = 32  # CosmicUnicorn.WIDTH
 HEIGHT = 32  # CosmicUnicorn.HEIGHT
 
@@ -24,12 +32,19 @@ rtc = machine.RTC()
 
 DAYS = ["Mon", "Tue", "Wed", "Thur", "Fri", "Sat", "Sun"]
 
-# Enable the Wireless
-wlan = network.WLAN(network.STA_IF)
-wlan.active(True)
+NTP_POLL_MS = 50  # how often the NTP reply is checked for, for up to ntptime.timeout seconds
+SYNC_RETRY_S = 5        # wait before trying a failed sync again, doubled on each failure
+SYNC_RETRY_MAX_S = 300  # up to this
+
+wlan = None
+
+# Pens, resolved in init() for whichever graphics surface we are drawing to
+RED = None
+WHITE = None
+BLACK = None
 
 
-def network_connect(SSID, PSK):
+async def network_connect(SSID, PSK):
 
     # Number of attempts to make before timeout
     max_wait = 5
@@ -43,38 +58,83 @@ def network_connect(SSID, PSK):
             break
         max_wait -= 1
         print('waiting for connection...')
-        time.sleep(1)
+        await asyncio.sleep(1)
 
     # Handle connection error. Switches the Warn LED on.
     if wlan.status() != 3:
         print("Unable to connect. Attempting connection again")
 
 
-# Function to sync the Pico RTC using NTP
-def sync_time():
-
+# Asks ntptime.host for the time like ntptime.time() does, but on a nonblocking socket that is
+# polled between awaits, so frames and input carry on while the reply is on its way. Only the
+# DNS lookup still blocks. Returns seconds since the epoch of time.gmtime()
+async def ntp_time():
+    query = bytearray(48)
+    query[0] = 0x1B
+    address = socket.getaddrinfo(ntptime.host, 123)[0][-1]
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     try:
-        network_connect(WIFI_SSID, WIFI_PASSWORD)
-    except NameError:
-        print("Create secrets.py with your WiFi credentials")
+        s.setblocking(False)
+        s.sendto(query, address)
+        deadline = time.ticks_add(time.ticks_ms(), int(ntptime.timeout * 1000))
+        while True:
+            try:
+                reply = s.recv(48)
+                break
+            except OSError:
+                if time.ticks_diff(time.ticks_ms(), deadline) >= 0:
+                    raise
+                await asyncio.sleep_ms(NTP_POLL_MS)
+    finally:
+        s.close()
+    # NTP counts from 1900, gmtime() from 2000 (1970 on some ports)
+    return struct.unpack("!I", reply[40:44])[0] - (3155673600 if time.gmtime(0)[0] == 2000 else 2208988800)
+
+
+# Function to sync the Pico RTC using NTP, connecting first unless already connected
+# Returns True once the RTC is set
+async def sync_time():
+
+    if not wlan.isconnected():
+        await network_connect(WIFI_SSID, WIFI_PASSWORD)
 
     if wlan.status() < 0 or wlan.status() >= 3:
         try:
-            ntptime.settime()
+            # set the RTC the way ntptime.settime() does
+            tm = time.gmtime(await ntp_time())
+            rtc.datetime((tm[0], tm[1], tm[2], tm[6] + 1, tm[3], tm[4], tm[5], 0))
+            return True
         except OSError:
             print("Unable to sync with NTP server. Check network and try again.")
+    return False
 
 
 def init():
+    global wlan, RED, WHITE, BLACK
 
-    sync_time()
+    pens = cache_for(graphics)
+    RED = pens.get(120, 0, 0, pinned=True)
+    WHITE = pens.get(255, 255, 255, pinned=True)
+    BLACK = pens.get(0, 0, 0, pinned=True)
 
+    # Enable the Wireless, the connection survives switching effects
+    wlan = network.WLAN(network.STA_IF)
+    wlan.active(True)
 
-def draw():
 
-    # Pens
-    RED = graphics.create_pen(120, 0, 0)
-    WHITE = graphics.create_pen(255, 255, 255)
+# Connects and syncs in the background, the date is shown from the RTC meanwhile. A failed
+# sync is tried again, less and less often, until it works or the effect is left
+async def task():
+    if WIFI_SSID is None and not wlan.isconnected():
+        print("Create secrets.py with your WiFi credentials")
+        return
+    retry_s = SYNC_RETRY_S
+    while not await sync_time():
+        await asyncio.sleep(retry_s)
+        retry_s = min(retry_s * 2, SYNC_RETRY_MAX_S)
+
+
+def draw():
 
     current_t = rtc.datetime()
 
@@ -96,4 +156,4 @@ def draw():
     graphics.set_font("bitmap8")
     graphics.text(str(current_t[2]), (WIDTH // 2) - (date_length // 2) + 1, 9, 32, 3)
 
-    graphics.set_pen(graphics.create_pen(0, 0, 0))
+    graphics.set_pen(BLACK)
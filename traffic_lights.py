@@ -2,12 +2,11 @@ import time
 import machine
 from cosmic import CosmicUnicorn
 from picographics import PicoGraphics, DISPLAY_COSMIC_UNICORN as DISPLAY
+from pens import cache_for
 
-# Setup display and device
-cu = CosmicUnicorn()
-graphics = PicoGraphics(DISPLAY)
-graphics.set_font("bitmap6")
-cu.set_brightness(0.6)
+# Display and device, set by main.py (or main() below)
+cu = None
+graphics = None
 
 WIDTH = CosmicUnicorn.WIDTH
 HEIGHT = CosmicUnicorn.HEIGHT
@@ -19,11 +18,21 @@ last_switch = 0
 # Durations in ms for each light
 DURATIONS = [4000, 2000, 10000]  # Red, Yellow, Green
 
+# Frame rate main.py runs draw() at, the lights only change every few seconds
+FPS = 2
+
 # Colors
 RED = (255, 0, 0)
 YELLOW = (255, 200, 0)
 GREEN = (0, 255, 0)
 GREY = (40, 40, 40)
+BODY = (60, 60, 60)
+
+# Pens, resolved in init() for whichever graphics surface we are drawing to
+black_pen = None
+body_pen = None
+grey_pen = None
+light_pens = None
 
 # Layout for 32x32 LED matrix (fit all lights within bounds)
 RADIUS = 4
@@ -48,10 +57,10 @@ def draw_traffic_light():
         state = (state + 1) % 3
         last_switch = now
     # Draw background
-    graphics.set_pen(graphics.create_pen(0, 0, 0))
+    graphics.set_pen(black_pen)
     graphics.clear()
     # Draw traffic light body (centered)
-    graphics.set_pen(graphics.create_pen(60, 60, 60))
+    graphics.set_pen(body_pen)
     graphics.rectangle(
         LIGHT_X - BODY_WIDTH // 2,
         BODY_TOP,
@@ -59,27 +68,34 @@ def draw_traffic_light():
         BODY_HEIGHT,
     )
     # Draw lights
-    for i, color in enumerate([RED, YELLOW, GREEN]):
-        if state == i:
-            pen = graphics.create_pen(*color)
-        else:
-            pen = graphics.create_pen(*GREY)
+    for i, pen in enumerate(light_pens):
+        if state != i:
+            pen = grey_pen
         graphics.set_pen(pen)
         graphics.circle(LIGHT_X, LIGHT_Y[i], RADIUS)
-    cu.update(graphics)
 
 def init():
-    global state, last_switch
+    global state, last_switch, black_pen, body_pen, grey_pen, light_pens
     state = 0
     last_switch = time.ticks_ms()
+    pens = cache_for(graphics)
+    black_pen = pens.get(0, 0, 0, pinned=True)
+    body_pen = pens.get(*BODY, pinned=True)
+    grey_pen = pens.get(*GREY, pinned=True)
+    light_pens = [pens.get(*color, pinned=True) for color in (RED, YELLOW, GREEN)]
     graphics.set_font("bitmap6")
-    graphics.set_pen(graphics.create_pen(0, 0, 0))
+    graphics.set_pen(black_pen)
     graphics.clear()
 
 def draw():
     draw_traffic_light()
 
 def main():
+    global cu, graphics
+    # Setup display and device
+    cu = CosmicUnicorn()
+    graphics = PicoGraphics(DISPLAY)
+    cu.set_brightness(0.6)
     init()
     while True:
         # Check if any buttons are pressed to exit
@@ -90,6 +106,7 @@ def main():
             machine.reset()
         
         draw()
+        cu.update(graphics)
         time.sleep(0.01)
 
 if __name__ == "__main__":